@@ -1,48 +1,132 @@
 # api_server.py
 import uvicorn
 from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 import logging
 import asyncio
-from main_processor import process_query, load_config, DEFAULT_CONFIG
+from contextlib import asynccontextmanager
+import importlib.util
+import orjson
+import multiprocessing
+import os
+import random
+import sys
+from typing import List, Optional
+import aiohttp
+from pydantic import BaseModel
+from main_processor import process_query, process_query_stream, load_config, DEFAULT_CONFIG, get_mistral_session, close_sessions, clear_caches, set_concurrency_limits
+from extractor import shutdown_extract_pool
+from scraper import start_driver_pool, DEFAULT_DRIVER_POOL_SIZE
 
 # Configure logging (can be more sophisticated in production)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the shared Mistral API session and pre-launches the Selenium fallback browsers on
+    startup; on shutdown, closes the sessions and browsers and stops the extraction worker processes.
+    """
+    await get_mistral_session()
+    await start_driver_pool(min(num_results, DEFAULT_DRIVER_POOL_SIZE))
+    yield
+    await close_sessions()
+    shutdown_extract_pool()
+
 app = FastAPI(
     title="Cabbage Search Engine API",
     description="An API to perform web searches, scrape content, and generate summaries.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
+# Errors from upstream services that are answered with a 502 instead of a 500
+UPSTREAM_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, TimeoutError, ValueError)
+
+# Fraction of unexpected errors that are logged with a full traceback
+TRACEBACK_SAMPLE_RATE = 0.01
+
+# Maximum number of queries accepted by one /search/batch request
+MAX_BATCH_QUERIES = 16
+
+class BatchSearchRequest(BaseModel):
+    """Request body for /search/batch."""
+    queries: List[str]
+
+# Response models let FastAPI serialize results natively through pydantic; fields a
+# result doesn't set (message, error) are left out of the JSON via response_model_exclude_unset
+class SearchResponse(BaseModel):
+    """Response body for /search, and one result of /search/batch."""
+    query: str
+    summary: Optional[str] = None
+    message: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchSearchResponse(BaseModel):
+    """Response body for /search/batch."""
+    results: List[SearchResponse]
+
 # Load configuration once at startup
 config = load_config()
 num_results = config.get("search_results_count", DEFAULT_CONFIG["search_results_count"])
 summary_sentences = config.get("summary_sentences_count", DEFAULT_CONFIG["summary_sentences_count"])
 mistral_model = config.get("mistral_model", DEFAULT_CONFIG["mistral_model"])
 mistral_tokens = config.get("mistral_max_tokens", DEFAULT_CONFIG["mistral_max_tokens"])
+skip_refine_below_tokens = config.get("skip_refine_below_tokens", DEFAULT_CONFIG["skip_refine_below_tokens"])
+set_concurrency_limits(
+    max_fetches=config.get("max_concurrent_fetches", DEFAULT_CONFIG["max_concurrent_fetches"]),
+    max_mistral_requests=config.get("max_concurrent_mistral_requests", DEFAULT_CONFIG["max_concurrent_mistral_requests"])
+)
 
-@app.post("/search", summary="Perform a web search and get a summary")
+async def stream_summary_events(query: str):
+    """Relays the streamed summary as Server-Sent Events, terminated by a [DONE] event."""
+    try:
+        async for chunk in process_query_stream(
+            query,
+            num_results,
+            summary_sentences,
+            mistral_model,
+            mistral_tokens,
+            skip_refine_below_tokens
+        ):
+            yield b"data: " + orjson.dumps({"delta": chunk}) + b"\n\n"
+        logging.info(f"Successfully streamed query: '{query}'")
+    except UPSTREAM_ERRORS as e:
+        # e.g. the Mistral stream broke off mid-summary: flag the deltas so far as incomplete
+        logging.warning(f"Upstream error streaming query '{query}': {type(e).__name__} - {e}")
+        yield b"data: " + orjson.dumps({"error": str(e)}) + b"\n\n"
+    except Exception as e:
+        # The response status is already sent, so report the failure in-band
+        logging.error(f"Error streaming API request for query '{query}': {e}", exc_info=True)
+        yield b"data: " + orjson.dumps({"error": f"An internal server error occurred: {str(e)}"}) + b"\n\n"
+    yield b"data: [DONE]\n\n"
+
+@app.post("/search", summary="Perform a web search and get a summary", response_model=SearchResponse, response_model_exclude_unset=True)
 async def perform_search(
-    query: str = Query(..., description="The search query to process.")
+    query: str = Query(..., description="The search query to process."),
+    stream: bool = Query(False, description="Stream the summary as Server-Sent Events instead of returning JSON.")
 ):
     """
     Takes a search query, finds relevant web pages, scrapes their content,
     and returns a consolidated summary.
+
+    With stream=true the summary is sent as `text/event-stream`, one
+    `data: {"delta": "..."}` event per chunk followed by `data: [DONE]`.
     """
     logging.info(f"Received API request for query: '{query}'")
+    if not query.strip():
+        return JSONResponse({"error": "Query must not be empty."}, status_code=400)
+    if stream:
+        return StreamingResponse(stream_summary_events(query), media_type="text/event-stream")
     try:
-        # Ensure the asyncio event loop is running or get the current one
-        loop = asyncio.get_event_loop()
-        if loop.is_closed():
-            asyncio.set_event_loop(asyncio.new_event_loop())
-
         # Call the existing processing logic
         final_summary = await process_query(
             query,
             num_results,
             summary_sentences,
             mistral_model,
-            mistral_tokens
+            mistral_tokens,
+            skip_refine_below_tokens
         )
 
         if final_summary:
@@ -53,11 +137,68 @@ async def perform_search(
             # Return 200 OK but indicate no summary could be generated
             return {"query": query, "summary": None, "message": "Could not generate a summary for this query."}
 
+    except UPSTREAM_ERRORS as e:
+        # Expected failures of the search/scrape/LLM backends: report them without a traceback
+        logging.warning(f"Upstream error processing query '{query}': {type(e).__name__} - {e}")
+        return JSONResponse({"query": query, "error": str(e)}, status_code=502)
     except Exception as e:
-        logging.error(f"Error processing API request for query '{query}': {e}", exc_info=True)
+        # Only a sample of unexpected errors log a full traceback, to keep the degraded path cheap
+        logging.error(f"Error processing API request for query '{query}': {e}", exc_info=random.random() < TRACEBACK_SAMPLE_RATE)
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {str(e)}")
 
+async def search_batch_item(query: str):
+    """Processes one query of a batch, reporting failures in its result instead of raising."""
+    try:
+        final_summary = await process_query(
+            query,
+            num_results,
+            summary_sentences,
+            mistral_model,
+            mistral_tokens,
+            skip_refine_below_tokens
+        )
+        if final_summary:
+            return {"query": query, "summary": final_summary}
+        return {"query": query, "summary": None, "message": "Could not generate a summary for this query."}
+    except UPSTREAM_ERRORS as e:
+        logging.warning(f"Upstream error processing batch query '{query}': {type(e).__name__} - {e}")
+        return {"query": query, "summary": None, "error": str(e)}
+    except Exception as e:
+        logging.error(f"Error processing batch query '{query}': {e}", exc_info=random.random() < TRACEBACK_SAMPLE_RATE)
+        return {"query": query, "summary": None, "error": f"An internal server error occurred: {str(e)}"}
+
+@app.post("/search/batch", summary="Summarize several search queries in one request", response_model=BatchSearchResponse, response_model_exclude_unset=True)
+async def perform_search_batch(request: BatchSearchRequest):
+    """
+    Takes a JSON body `{"queries": [...]}` and processes the queries concurrently.
+
+    Returns `{"results": [...]}` in the same order as the queries; each result has
+    the shape of a /search response, with an `error` field if that query failed.
+    """
+    queries = request.queries
+    logging.info(f"Received API batch request with {len(queries)} queries")
+    if not queries or any(not query.strip() for query in queries):
+        return JSONResponse({"error": "Queries must be a non-empty list of non-empty strings."}, status_code=400)
+    if len(queries) > MAX_BATCH_QUERIES:
+        return JSONResponse({"error": f"At most {MAX_BATCH_QUERIES} queries are accepted per batch."}, status_code=400)
+    results = await asyncio.gather(*(search_batch_item(query) for query in queries))
+    return {"results": results}
+
+@app.post("/admin/cache/clear", summary="Clear cached search results")
+async def clear_cache():
+    """
+    Purges the cached query results and first summaries (e.g. between deploys).
+    """
+    clear_caches()
+    return {"status": "ok"}
+
 if __name__ == "__main__":
-    # Run the server using uvicorn
-    # Use reload=True for development to automatically reload on code changes
-    uvicorn.run("api_server:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    # Needed for the extraction process pool in frozen executables on Windows
+    multiprocessing.freeze_support()
+    # Run the server using uvicorn, on uvloop + httptools when they are installed
+    # (both are C-accelerated; uvloop is unavailable on Windows)
+    loop_impl = "uvloop" if sys.platform != "win32" and importlib.util.find_spec("uvloop") else "asyncio"
+    http_impl = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    # Set CABBAGE_RELOAD=1 during development to automatically reload on code changes
+    reload = os.environ.get("CABBAGE_RELOAD") == "1"
+    uvicorn.run("api_server:app", host="127.0.0.1", port=8000, loop=loop_impl, http=http_impl, reload=reload)
\ No newline at end of file
@@ -0,0 +1,50 @@
+import logging
+from datasketch import MinHash, MinHashLSH
+
+# --- Constants ---
+DEDUP_THRESHOLD = 0.8 # Estimated Jaccard similarity above which two texts count as duplicates
+DEDUP_NUM_PERM = 128 # Number of MinHash permutations (accuracy vs. speed)
+SHINGLE_SIZE = 5 # Words per shingle
+
+# --- Functions ---
+def _minhash(text):
+    """Builds a MinHash signature of the text from overlapping word shingles."""
+    words = text.split()
+    mh = MinHash(num_perm=DEDUP_NUM_PERM)
+    if len(words) <= SHINGLE_SIZE:
+        mh.update(" ".join(words).encode("utf-8"))
+        return mh
+    mh.update_batch(
+        " ".join(words[i:i + SHINGLE_SIZE]).encode("utf-8")
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    )
+    return mh
+
+def deduplicate_texts(texts):
+    """
+    Removes near-duplicate texts using MinHash LSH.
+
+    Each text is compared against the texts kept so far in a single pass, so the
+    cost grows linearly with the number of texts instead of pairwise. The first
+    occurrence of a group of near-duplicates is kept.
+
+    Args:
+        texts (list): Extracted texts (None/empty entries are ignored).
+
+    Returns:
+        list: The texts in the same positions, with near-duplicate (and empty) entries set to None.
+    """
+    lsh = MinHashLSH(threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM)
+    unique_texts = [None] * len(texts)
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        mh = _minhash(text)
+        duplicates = lsh.query(mh)
+        if duplicates:
+            logging.debug(f"Skipping near-duplicate text #{i} (matches text #{duplicates[0]})")
+            continue
+        lsh.insert(i, mh)
+        unique_texts[i] = text
+    logging.debug(f"Deduplication kept {sum(text is not None for text in unique_texts)} of {len(texts)} texts.")
+    return unique_texts
@@ -0,0 +1,62 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import trafilatura
+from trafilatura.settings import Extractor
+
+# Kept free of heavy imports: worker processes import this module to run extractions.
+
+# Per-page extraction time budget (seconds). Enforced by callers awaiting the pool
+# (see main_processor.extract_texts); Trafilatura's own EXTRACTION_TIMEOUT setting only
+# applies to its command-line interface, not to trafilatura.extract().
+EXTRACTION_TIMEOUT = 5
+
+# Trafilatura options are built once per process and reused for every page:
+# - fast: skip the slower fallback extractors (readability/justext second pass)
+# - precision: favor precise boilerplate removal over recall
+# - no comments or tables, for cleaner text
+_EXTRACT_OPTIONS = Extractor(
+    output_format="txt",
+    fast=True,
+    precision=True,
+    comments=False,
+    tables=False,
+)
+
+# Process pool for CPU-bound Trafilatura extraction (created lazily on first use)
+_EXTRACT_POOL = None
+
+def get_extract_pool():
+    """Returns the shared process pool used for extraction, creating it on first use."""
+    global _EXTRACT_POOL
+    if _EXTRACT_POOL is None:
+        _EXTRACT_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+        logging.debug(f"Created extraction process pool ({os.cpu_count()} workers).")
+    return _EXTRACT_POOL
+
+def discard_extract_pool(pool):
+    """
+    Drops a broken process pool (one of its workers died) so get_extract_pool() builds a new one.
+
+    A ProcessPoolExecutor stays unusable once broken, so without this every later
+    extraction would fail until the process restarts.
+    """
+    global _EXTRACT_POOL
+    if _EXTRACT_POOL is pool:
+        _EXTRACT_POOL = None
+        logging.warning("Extraction process pool is broken (a worker died); it will be recreated.")
+    pool.shutdown(wait=False)
+
+def shutdown_extract_pool():
+    """Shuts down the extraction process pool, if one was started."""
+    global _EXTRACT_POOL
+    if _EXTRACT_POOL is not None:
+        _EXTRACT_POOL.shutdown(wait=True)
+        _EXTRACT_POOL = None
+        logging.debug("Extraction process pool shut down.")
+
+def extract_main_text(html_content):
+    """Extracts the main text content from raw HTML using Trafilatura (None if nothing usable)."""
+    if not html_content:
+        return None # Carry over the scraping failure
+    return trafilatura.extract(html_content, options=_EXTRACT_OPTIONS) or None
@@ -0,0 +1,92 @@
+import math
+import logging
+import numpy
+from sumy.summarizers.lsa import LsaSummarizer
+
+# Numba is optional: when missing, the vectorized NumPy implementation below is used.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# --- Constants ---
+TF_SMOOTHING = 0.4 # Same smoothing Sumy uses for maximum TF normalization
+
+# --- Functions ---
+def _lsa_ranks_numpy(matrix, smooth, dimensions):
+    """
+    Computes LSA sentence ranks from a |words| x |sentences| count matrix (pure NumPy).
+
+    Mirrors Sumy's LsaSummarizer: smoothed maximum-TF normalization per sentence,
+    SVD, then rank_j = sqrt(sum_i sigma_i^2 * v_ij^2) over the first `dimensions`
+    singular values.
+    """
+    max_frequencies = matrix.max(axis=0)
+    columns = max_frequencies != 0
+    matrix[:, columns] = smooth + (1.0 - smooth) * (matrix[:, columns] / max_frequencies[columns])
+    _, sigma, v = numpy.linalg.svd(matrix, full_matrices=False)
+    powered_sigma = sigma ** 2
+    powered_sigma[dimensions:] = 0.0
+    return numpy.sqrt(powered_sigma @ (v ** 2))
+
+def _lsa_ranks_kernel(matrix, smooth, dimensions):
+    """Loop form of _lsa_ranks_numpy(), written for Numba's nopython mode."""
+    rows, cols = matrix.shape
+    for col in range(cols):
+        max_frequency = 0.0
+        for row in range(rows):
+            if matrix[row, col] > max_frequency:
+                max_frequency = matrix[row, col]
+        if max_frequency != 0.0:
+            for row in range(rows):
+                matrix[row, col] = smooth + (1.0 - smooth) * (matrix[row, col] / max_frequency)
+    _, sigma, v = numpy.linalg.svd(matrix, full_matrices=False)
+    ranks = numpy.zeros(v.shape[1], dtype=matrix.dtype)
+    kept = min(dimensions, sigma.shape[0])
+    for col in range(v.shape[1]):
+        rank = 0.0
+        for i in range(kept):
+            rank += sigma[i] * sigma[i] * v[i, col] * v[i, col]
+        ranks[col] = math.sqrt(rank)
+    return ranks
+
+def _compile_lsa_ranks():
+    """Returns the JIT-compiled rank function, or the NumPy one if Numba is unavailable or fails."""
+    if njit is None:
+        return _lsa_ranks_numpy
+    try:
+        compiled = njit(cache=True, fastmath=True)(_lsa_ranks_kernel)
+        # Warm up (compile, or load from the on-disk cache) now so the first query doesn't pay for it
+        compiled(numpy.eye(3, dtype=numpy.float32), TF_SMOOTHING, 3)
+        logging.debug("Using Numba-compiled LSA scoring.")
+        return compiled
+    except Exception as e:
+        logging.warning(f"Numba compilation of LSA scoring failed, using NumPy instead: {e}")
+        return _lsa_ranks_numpy
+
+lsa_ranks = _compile_lsa_ranks()
+
+# --- Classes ---
+class FastLsaSummarizer(LsaSummarizer):
+    """
+    Drop-in replacement for Sumy's LsaSummarizer with a compiled scoring step.
+
+    Sumy normalizes the term-sentence matrix and computes ranks in Python loops,
+    which dominates runtime on large inputs. This subclass keeps Sumy's
+    dictionary/matrix construction and sentence selection, and runs the
+    normalization, SVD and ranking in float32 through lsa_ranks().
+    """
+
+    def __call__(self, document, sentences_count):
+        self._ensure_dependecies_installed()
+
+        dictionary = self._create_dictionary(document)
+        # empty document
+        if not dictionary:
+            return ()
+
+        matrix = self._create_matrix(document, dictionary).astype(numpy.float32)
+        dimensions = max(LsaSummarizer.MIN_DIMENSIONS, int(min(matrix.shape) * LsaSummarizer.REDUCTION_RATIO))
+        ranks = iter(lsa_ranks(matrix, TF_SMOOTHING, dimensions).tolist())
+        return self._get_best_sentences(document.sentences, sentences_count,
+            lambda s: next(ranks))
@@ -1,14 +1,22 @@
 import argparse
 import logging
 import json # To potentially save structured data later
-import trafilatura # Import the library
 import nltk
 import asyncio # Added for async operations
+import functools
+import hashlib
+import string
+from dataclasses import dataclass
+from typing import List, Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from async_lru import alru_cache
 import aiohttp # Added for HTTP requests
+import orjson # Faster JSON encoding/decoding for API payloads
 # Sumy imports
 from sumy.parsers.plaintext import PlaintextParser
 from sumy.nlp.tokenizers import Tokenizer
-from sumy.summarizers.lsa import LsaSummarizer
 from sumy.nlp.stemmers import Stemmer
 from sumy.utils import get_stop_words
 from dotenv import load_dotenv # Correct import
@@ -19,7 +27,10 @@ import os # Added for environment variables
 
 # Import functions from our other modules
 from search_module import search_urls
-from scraper import scrape_website # Assuming scraper.py is in the same directory
+from scraper import scrape_website, scrape_with_selenium, NON_HTML, get_fetch_session, close_fetch_session, close_stale_session, close_driver_pool, set_fetch_limit # Assuming scraper.py is in the same directory
+from extractor import extract_main_text, get_extract_pool, discard_extract_pool, EXTRACTION_TIMEOUT
+from dedup import deduplicate_texts
+from lsa_summarizer import FastLsaSummarizer
 
 # Load environment variables from .env file
 load_dotenv()
@@ -28,15 +39,17 @@ load_dotenv()
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s') # This line should remain commented
 
 # --- NLTK Data Download ---
-# Ensure 'punkt' tokenizer data is available for Sumy
-try:
-    logging.debug("Ensuring NLTK 'punkt' and 'punkt_tab' data are available...")
-    nltk.download('punkt', quiet=True)
-    nltk.download('punkt_tab', quiet=False) # Remove quiet=True to see potential errors
-    logging.debug("'punkt' and 'punkt_tab' download check complete.")
-except Exception as e:
-    # Log error but proceed; summarization might fail later
-    logging.error(f"Error during NLTK 'punkt' download check: {e}")
+# Ensure 'punkt' tokenizer data is available for Sumy (only downloads when missing)
+for _nltk_resource in ('punkt', 'punkt_tab'):
+    try:
+        nltk.data.find(f'tokenizers/{_nltk_resource}')
+    except LookupError:
+        try:
+            logging.debug(f"NLTK '{_nltk_resource}' data not found, downloading...")
+            nltk.download(_nltk_resource, quiet=True)
+        except Exception as e:
+            # Log error but proceed; summarization might fail later
+            logging.error(f"Error during NLTK '{_nltk_resource}' download: {e}")
 
 
 # --- Configuration Loading ---
@@ -44,7 +57,10 @@ DEFAULT_CONFIG = {
     "search_results_count": 5,
     "summary_sentences_count": 50,
     "mistral_model": "mistral-small-latest", # Default Mistral model
-    "mistral_max_tokens": 150 # Default max tokens for Mistral summary
+    "mistral_max_tokens": 150, # Default max tokens for Mistral summary
+    "skip_refine_below_tokens": 0, # Skip Mistral for first summaries shorter than this (0 = always refine)
+    "max_concurrent_fetches": 32, # Max page fetches in flight across all queries
+    "max_concurrent_mistral_requests": 8 # Max Mistral API calls in flight across all queries
 }
 
 # --- Mistral API Configuration ---
@@ -54,6 +70,85 @@ mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
 if not mistral_api_key:
     logging.warning("MISTRAL_API_KEY environment variable not set. Mistral summarization will be skipped.")
 
+# --- Token Counting ---
+# tiktoken is optional; it is not Mistral's tokenizer, but close enough to size a summary.
+# The encoding is loaded on first use, since loading it can mean a download, and it is
+# only needed when skip_refine_below_tokens is enabled.
+@functools.lru_cache(maxsize=None)
+def _get_token_encoding():
+    """Returns the cl100k_base tiktoken encoding, or None if it is unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e: # ImportError, or the encoding could not be loaded (e.g. offline)
+        logging.debug(f"tiktoken encoding unavailable, estimating token counts instead: {e}")
+        return None
+
+# Shared aiohttp session for Mistral calls (created lazily inside the running event loop)
+_MISTRAL_SESSION = None
+_MISTRAL_SESSION_LOOP = None
+
+# Global cap on simultaneous Mistral API calls (see set_concurrency_limits)
+_MISTRAL_LIMIT = DEFAULT_CONFIG["max_concurrent_mistral_requests"]
+_MISTRAL_SEMAPHORE = None
+_MISTRAL_SEMAPHORE_LOOP = None
+
+def set_concurrency_limits(max_fetches=None, max_mistral_requests=None):
+    """
+    Sets global caps on outbound requests shared by all concurrent queries.
+
+    Args:
+        max_fetches (int): Max page fetches in flight at once (None keeps the current value).
+        max_mistral_requests (int): Max Mistral API calls in flight at once (None keeps the current value).
+    """
+    global _MISTRAL_LIMIT, _MISTRAL_SEMAPHORE
+    if max_fetches is not None:
+        set_fetch_limit(max_fetches)
+    if max_mistral_requests is not None:
+        _MISTRAL_LIMIT = max_mistral_requests
+        _MISTRAL_SEMAPHORE = None # Recreated with the new limit on next use
+
+def _get_mistral_semaphore():
+    """Returns the semaphore bounding concurrent Mistral calls, creating it for the running event loop."""
+    global _MISTRAL_SEMAPHORE, _MISTRAL_SEMAPHORE_LOOP
+    loop = asyncio.get_running_loop()
+    if _MISTRAL_SEMAPHORE is None or _MISTRAL_SEMAPHORE_LOOP is not loop:
+        _MISTRAL_SEMAPHORE = asyncio.Semaphore(_MISTRAL_LIMIT)
+        _MISTRAL_SEMAPHORE_LOOP = loop
+    return _MISTRAL_SEMAPHORE
+
+async def get_mistral_session():
+    """
+    Returns the shared aiohttp session used for Mistral API calls, creating it on first use.
+
+    Reusing one session keeps connections to the Mistral API alive across queries
+    instead of paying connection setup and a TLS handshake per request. A session
+    left over from a previous event loop is released before a new one is built.
+    """
+    global _MISTRAL_SESSION, _MISTRAL_SESSION_LOOP
+    loop = asyncio.get_running_loop()
+    if _MISTRAL_SESSION_LOOP is not loop:
+        await close_stale_session(_MISTRAL_SESSION, _MISTRAL_SESSION_LOOP)
+    if _MISTRAL_SESSION is None or _MISTRAL_SESSION.closed or _MISTRAL_SESSION_LOOP is not loop:
+        _MISTRAL_SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+        _MISTRAL_SESSION_LOOP = loop
+        logging.debug("Created shared Mistral API session.")
+    return _MISTRAL_SESSION
+
+async def close_sessions():
+    """Closes the shared HTTP sessions (Mistral API and page fetching) and pooled browsers. Call on shutdown."""
+    global _MISTRAL_SESSION, _MISTRAL_SESSION_LOOP
+    if _MISTRAL_SESSION is not None and not _MISTRAL_SESSION.closed:
+        await _MISTRAL_SESSION.close()
+        logging.debug("Shared Mistral API session closed.")
+    _MISTRAL_SESSION = None
+    _MISTRAL_SESSION_LOOP = None
+    await close_fetch_session()
+    await close_driver_pool()
+
 
 import pathlib # Import pathlib
 
@@ -91,20 +186,126 @@ def load_config(config_path=None):
 LANGUAGE = "english" # Language for summarization
 # SENTENCES_COUNT removed, will be loaded from config
 
+# --- Caches ---
+SUMMARY_CACHE_MAXSIZE = 1024 # Max number of memoized first summaries
+QUERY_CACHE_MAXSIZE = 512 # Max number of memoized final summaries
+QUERY_CACHE_TTL = 3600 # Seconds a final summary stays valid (search results go stale)
+
+_SUMMARY_CACHE = OrderedDict() # (text digest, sentences_count) -> summary, in LRU order
+_SUMMARY_CACHE_LOCK = threading.Lock()
+
+class _UncacheableResult(Exception):
+    """Raised inside the cached pipeline so that failed (empty) results are not memoized."""
+
+def clear_caches():
+    """Clears the memoized query results and first summaries."""
+    _cached_process_query.cache_clear()
+    with _SUMMARY_CACHE_LOCK:
+        _SUMMARY_CACHE.clear()
+    logging.info("Cleared query and summary caches.")
+
+@functools.lru_cache(maxsize=None)
+def _get_lsa_pipeline():
+    """Builds the Sumy tokenizer and LSA summarizer once; they are reused for every summary."""
+    tokenizer = Tokenizer(LANGUAGE)
+    summarizer = FastLsaSummarizer(Stemmer(LANGUAGE))
+    summarizer.stop_words = frozenset(get_stop_words(LANGUAGE))
+    return tokenizer, summarizer
+
+# --- Data Structures ---
+@dataclass
+class ScrapeBatch:
+    """
+    Per-URL pipeline state stored as parallel lists (index i describes urls[i]).
+
+    Attributes:
+        urls (list): The search result URLs, in search order.
+        htmls (list): Raw HTML per URL, or None where scraping failed.
+        extracts (list): Extracted main text per URL, or None where extraction failed.
+        skipped (list): True where the URL served non-HTML content (never retried with Selenium).
+    """
+    __slots__ = ("urls", "htmls", "extracts", "skipped")
+    urls: List[str]
+    htmls: List[Optional[str]]
+    extracts: List[Optional[str]]
+    skipped: List[bool]
+
 # --- Functions ---
+async def extract_texts(html_contents):
+    """
+    Extracts main text from several HTML documents in parallel on the extraction process pool.
+
+    Pages not extracted within EXTRACTION_TIMEOUT seconds of submission are given up on.
+    A page still queued is dropped from the pool; one already running is finished by its
+    worker in the background, but the query no longer waits for it. If a worker process
+    dies, the pool is replaced and the affected pages count as failed extractions.
+
+    Args:
+        html_contents (list): Raw HTML strings (None entries are skipped).
+
+    Returns:
+        list: Extracted texts in the same order, with None where nothing could be extracted.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_extract_pool()
+    indices = [i for i, html_content in enumerate(html_contents) if html_content]
+    extracted = [None] * len(html_contents)
+    futures = []
+    try:
+        for i in indices:
+            futures.append(loop.run_in_executor(pool, extract_main_text, html_contents[i]))
+    except BrokenProcessPool:
+        # Submitting raises once a worker has died; give up on this batch and rebuild the pool
+        for future in futures:
+            future.cancel()
+        discard_extract_pool(pool)
+        return extracted
+    results = await asyncio.gather(
+        *(asyncio.wait_for(future, EXTRACTION_TIMEOUT) for future in futures),
+        return_exceptions=True
+    )
+    if any(isinstance(result, BrokenProcessPool) for result in results):
+        discard_extract_pool(pool) # A worker died while extracting this batch
+    for i, result in zip(indices, results):
+        if isinstance(result, BrokenProcessPool):
+            continue # Logged by discard_extract_pool
+        if isinstance(result, asyncio.TimeoutError):
+            logging.warning(f"Trafilatura extraction timed out after {EXTRACTION_TIMEOUT}s, skipping page.")
+        elif isinstance(result, BaseException):
+            logging.error(f"Error during Trafilatura extraction: {type(result).__name__} - {result}")
+        else:
+            extracted[i] = result
+    return extracted
+
 def summarize_text(text, sentences_count):
-    """Summarizes the given text using Sumy LSA."""
+    """Summarizes the given text using Sumy LSA (results are memoized by a hash of the text)."""
     if not text or not isinstance(text, str) or len(text.strip()) == 0:
         logging.warning("Cannot summarize empty or invalid text.")
         return ""
 
+    # Key on a digest rather than the text itself so the cache doesn't pin large inputs in memory
+    cache_key = (hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest(), sentences_count)
+    with _SUMMARY_CACHE_LOCK:
+        if cache_key in _SUMMARY_CACHE:
+            _SUMMARY_CACHE.move_to_end(cache_key)
+            logging.debug("Using cached first summary.")
+            return _SUMMARY_CACHE[cache_key]
+
+    summary = _summarize_uncached(text, sentences_count)
+    if summary:
+        with _SUMMARY_CACHE_LOCK:
+            _SUMMARY_CACHE[cache_key] = summary
+            if len(_SUMMARY_CACHE) > SUMMARY_CACHE_MAXSIZE:
+                _SUMMARY_CACHE.popitem(last=False)
+    return summary
+
+def _summarize_uncached(text, sentences_count):
+    """Runs the Sumy LSA summarizer on the given text."""
     logging.debug(f"Summarizing text ({len(text)} chars) to {sentences_count} sentences...") # Changed to DEBUG
     try:
-        # Use the standard parser with the string and tokenizer
-        parser = PlaintextParser.from_string(text, Tokenizer(LANGUAGE))
-        stemmer = Stemmer(LANGUAGE)
-        summarizer = LsaSummarizer(stemmer)
-        summarizer.stop_words = get_stop_words(LANGUAGE)
+        # Use the standard parser with the string and the cached tokenizer
+        tokenizer, summarizer = _get_lsa_pipeline()
+        parser = PlaintextParser.from_string(text, tokenizer)
 
         summary_sentences = summarizer(parser.document, sentences_count)
         summary = " ".join(str(sentence) for sentence in summary_sentences)
@@ -114,150 +315,277 @@ def summarize_text(text, sentences_count):
         logging.error(f"Error during summarization: {e}")
         return "" # Return empty string on error
 
-async def process_query(query, num_results, summary_sentences, mistral_model_name, mistral_max_tokens): # Made async, updated config params
+async def process_query(query, num_results, summary_sentences, mistral_model_name, mistral_max_tokens, skip_refine_below_tokens=0): # Made async, updated config params
     """
     Orchestrates the process: search, scrape, extract, summarize (x2).
 
+    Successful results are cached for QUERY_CACHE_TTL seconds per unique set of
+    arguments; identical concurrent calls share a single pipeline run.
+
     Args:
         query (str): The user's search query.
         num_results (int): The number of search results to process.
         summary_sentences (int): Number of sentences for the first summary.
         mistral_model_name (str): The Mistral model to use.
         mistral_max_tokens (int): Max tokens for the second (Mistral) summary.
+        skip_refine_below_tokens (int): First summaries shorter than this many tokens are
+            returned without the Mistral step. 0 (the default) always refines.
 
     Returns:
         str: A summary of the combined content from the scraped URLs,
              or an empty string if the process fails at any critical step.
     """
+    try:
+        return await _cached_process_query(query, num_results, summary_sentences, mistral_model_name, mistral_max_tokens, skip_refine_below_tokens)
+    except _UncacheableResult:
+        return ""
+
+@alru_cache(maxsize=QUERY_CACHE_MAXSIZE, ttl=QUERY_CACHE_TTL)
+async def _cached_process_query(query, num_results, summary_sentences, mistral_model_name, mistral_max_tokens, skip_refine_below_tokens):
+    """Memoized wrapper around _run_pipeline(); empty results raise instead of being cached."""
+    final_summary = await _run_pipeline(query, num_results, summary_sentences, mistral_model_name, mistral_max_tokens, skip_refine_below_tokens)
+    if not final_summary:
+        raise _UncacheableResult()
+    return final_summary
+
+async def _run_pipeline(query, num_results, summary_sentences, mistral_model_name, mistral_max_tokens, skip_refine_below_tokens=0):
+    """Runs the full search/scrape/extract/summarize pipeline (see process_query)."""
     logging.debug(f"Starting processing for query: '{query}'") # Changed to DEBUG
+    first_summary = await _build_first_summary(query, num_results, summary_sentences)
+    final_summary = await _refine_with_mistral(query, first_summary, mistral_model_name, mistral_max_tokens, skip_refine_below_tokens)
+    logging.debug("Processing finished.") # Changed to DEBUG
+    return final_summary # Return the final (potentially double) summary
+
+async def process_query_stream(query, num_results, summary_sentences, mistral_model_name, mistral_max_tokens, skip_refine_below_tokens=0):
+    """
+    Streaming variant of process_query: yields the final summary in chunks as Mistral generates it.
+
+    Takes the same arguments as process_query. Results are not cached. If the
+    Mistral step is skipped, or fails before producing any output, the first
+    (LSA) summary is yielded as a single chunk instead.
 
+    Yields:
+        str: Consecutive pieces of the final summary.
+
+    Raises:
+        Exception: The Mistral stream's error, if it fails after some chunks were
+            already yielded (the summary so far is incomplete).
+    """
+    logging.debug(f"Starting streamed processing for query: '{query}'")
+    first_summary = await _build_first_summary(query, num_results, summary_sentences)
+    async for chunk in _stream_with_mistral(query, first_summary, mistral_model_name, mistral_max_tokens, skip_refine_below_tokens):
+        yield chunk
+    logging.debug("Streamed processing finished.")
+
+async def _build_first_summary(query, num_results, summary_sentences):
+    """Searches, scrapes, extracts and LSA-summarizes; returns the first summary or an empty string."""
     # 1. Search for URLs
-    urls = search_urls(query, num_results=num_results)
+    urls = await search_urls(query, num_results=num_results)
     if not urls:
         logging.error("Search returned no URLs. Aborting process.")
-        return {}
-
-    # 2. Scrape HTML content for each URL
-    scraped_data = {}
-    logging.debug(f"Fetching content for {len(urls)} URLs...") # Changed to DEBUG
-    for i, url in enumerate(urls):
-        logging.debug(f"Fetching URL {i+1}/{len(urls)}: {url}") # Changed to DEBUG
-        html_content = scrape_website(url) # Using the function from scraper.py
-        scraped_data[url] = html_content
-        if html_content:
-            logging.debug(f"Successfully scraped: {url} ({len(html_content)} bytes)") # Changed to DEBUG
-        else:
-            logging.warning(f"Failed to scrape: {url}") # Kept WARNING
+        return ""
 
-    # --- Placeholder for Future Steps ---
+    # 2. Fetch HTML content for all URLs concurrently over plain HTTP
+    logging.debug(f"Fetching content for {len(urls)} URLs...")
+    session = await get_fetch_session()
+    results = await asyncio.gather(*(scrape_website(session, url) for url in urls), return_exceptions=True)
+    batch = ScrapeBatch(
+        urls=list(urls),
+        htmls=[None if isinstance(result, BaseException) or result is NON_HTML else result for result in results],
+        extracts=[],
+        skipped=[result is NON_HTML for result in results]
+    )
 
     # 3. Extract Main Content using Trafilatura
-    extracted_texts = {}
     logging.debug("Extracting main content using Trafilatura...") # Changed to DEBUG
-    for url, html_content in scraped_data.items():
-        if html_content:
-            # Use trafilatura to extract the main text content
-            # include_comments=False, include_tables=False can be added for cleaner text
-            extracted_text = trafilatura.extract(html_content, include_comments=False, include_tables=False)
-            if extracted_text:
-                extracted_texts[url] = extracted_text
-                logging.debug(f"Successfully extracted content from: {url} ({len(extracted_text)} chars)") # Changed to DEBUG
-            else:
-                logging.warning(f"Trafilatura could not extract main content from: {url}") # Kept WARNING
-                extracted_texts[url] = None # Mark as failed extraction
+    batch.extracts = await extract_texts(batch.htmls)
+
+    # 3a. Fall back to Selenium only for pages where the plain HTTP result yielded no extract
+    #     (typically JavaScript-rendered pages or fetches that were blocked); PDFs, images and
+    #     other non-HTML responses would only waste a browser slot
+    browser_indices = [i for i in range(len(batch.urls)) if not batch.extracts[i] and not batch.skipped[i]]
+    if browser_indices:
+        logging.debug(f"Falling back to Selenium for {len(browser_indices)} URLs...")
+        browser_results = await asyncio.gather(*(scrape_with_selenium(batch.urls[i]) for i in browser_indices))
+        browser_extracts = await extract_texts(browser_results)
+        for i, html_content, extracted_text in zip(browser_indices, browser_results, browser_extracts):
+            batch.htmls[i] = html_content
+            batch.extracts[i] = extracted_text
+
+    for i in range(len(batch.urls)):
+        if batch.skipped[i]:
+            continue # Already logged by scrape_website
+        if not batch.htmls[i]:
+            logging.warning(f"Failed to scrape: {batch.urls[i]}") # Kept WARNING
+        elif batch.extracts[i]:
+            logging.debug(f"Successfully extracted content from: {batch.urls[i]} ({len(batch.extracts[i])} chars)") # Changed to DEBUG
         else:
-            extracted_texts[url] = None # Carry over the scraping failure
+            logging.warning(f"Trafilatura could not extract main content from: {batch.urls[i]}") # Kept WARNING
 
-    # 3b. Deduplication (Requires Implementation)
-    #    - Compare extracted_texts values to remove duplicates or near-duplicates
-    #    - Techniques: Check for exact matches, use hashing (e.g., MinHash), or semantic similarity.
-    logging.debug("[Placeholder] Next step: Deduplicate extracted content.") # Changed to DEBUG
-    processed_content = extracted_texts # For now, pass all extracted texts
+    # 3b. Deduplication: drop near-duplicate articles (MinHash LSH) so they aren't summarized twice.
+    #     MinHash is CPU-bound, so it runs in the default executor.
+    logging.debug("Deduplicating extracted content...")
+    loop = asyncio.get_running_loop()
+    batch.extracts = await loop.run_in_executor(None, deduplicate_texts, batch.extracts)
 
     # 4. Combine and Summarize Content
     # Combine all non-empty extracted texts into one large string
-    combined_text = "\n\n".join(text for text in processed_content.values() if text and text.strip())
+    combined_text = "\n\n".join(text for text in batch.extracts if text and text.strip())
 
     if not combined_text:
         logging.warning("No valid text content extracted to summarize.")
-        final_summary = ""
-    else:
-        logging.debug("Performing first summarization (LSA)...") # Changed to DEBUG
-        first_summary = summarize_text(combined_text, sentences_count=summary_sentences)
+        return ""
+
+    logging.debug("Performing first summarization (LSA)...") # Changed to DEBUG
+    return summarize_text(combined_text, sentences_count=summary_sentences)
 
-        # 5. Second Summarization using Mistral API via aiohttp
-        if first_summary and mistral_api_key: # Check if API key is available
-            logging.debug(f"Performing second summarization using Mistral API (model: {mistral_model_name})...") # Changed to DEBUG
-            try:
-                # Construct the prompt (Revised again to ignore unclear parts, stick to text)
-                system_prompt = f"""You are an expert summarizer tasked with refining an initial summary. The provided text is the result of a web search for the query "{query}" and has already been summarized once, but might contain incomplete sentences or unclear phrasing.
+# --- Mistral Prompt Templates ---
+# Compiled once; only the query (and the summary to refine) vary per request.
+# Prompt revised to ignore unclear parts and stick to the provided text.
+_SYSTEM_PROMPT_TEMPLATE = string.Template("""You are an expert summarizer tasked with refining an initial summary. The provided text is the result of a web search for the query "$query" and has already been summarized once, but might contain incomplete sentences or unclear phrasing.
 
-Your goal is to produce a final, comprehensive, and coherent summary that directly answers the query "{query}", based *only* on the information provided in the initial summary text.
+Your goal is to produce a final, comprehensive, and coherent summary that directly answers the query "$query", based *only* on the information provided in the initial summary text.
 
 - Ensure **all key information relevant to the query** from the provided text is included. Do not omit relevant details.
 - If parts of the initial summary are too incomplete or unclear to be accurately represented, **ignore those specific parts**. Do not add information not present in the provided text.
 - Focus on summarizing the clear and complete information relevant to the query, ensuring the final output is well-written and flows logically.
-- Focus only on content relevant to "{query}" and ignore irrelevant details or sections.
-"""
-                user_prompt = f"""Initial Summary Text to Refine:
----
-{first_summary}
+- Focus only on content relevant to "$query" and ignore irrelevant details or sections.
+""")
+_USER_PROMPT_PREFIX = "Initial Summary Text to Refine:\n---\n"
+_USER_PROMPT_SUFFIX_TEMPLATE = string.Template("""
 ---
 
-Based on the query "{query}", provide the refined and comprehensive summary:""" # Slightly adjusted user prompt wording
-
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
-
-                headers = {
-                    "Authorization": f"Bearer {mistral_api_key}",
-                    "Content-Type": "application/json",
-                    "Accept": "application/json"
-                }
-                payload = {
-                    "model": mistral_model_name,
-                    "messages": messages,
-                    "max_tokens": mistral_max_tokens
-                }
-
-                # Make the API call using aiohttp
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(mistral_api_url, headers=headers, json=payload) as response:
-                        response.raise_for_status() # Raise exception for bad status codes
-                        json_response = await response.json()
-
-                        if json_response.get('choices'):
-                            final_summary = json_response['choices'][0]['message']['content'].strip()
-                            logging.debug(f"Generated Mistral summary ({len(final_summary)} chars) using model {mistral_model_name} with max_tokens: {mistral_max_tokens}.") # Changed to DEBUG
-                        else:
-                            logging.warning("Mistral API returned no choices. Falling back to the first summary.") # Kept WARNING
-                            final_summary = first_summary
-
-            except aiohttp.ClientResponseError as e:
-                 logging.error(f"Mistral API HTTP Error: {e.status} - {e.message}")
-                 try:
-                     error_body = await e.text()
-                     logging.error(f"API Error Body: {error_body}")
-                 except Exception:
-                     pass # Ignore if reading body fails
-                 logging.warning("Falling back to the first summary.")
-                 final_summary = first_summary
-            except Exception as e:
-                logging.error(f"Error during Mistral API call: {type(e).__name__} - {e}")
-                logging.warning("Falling back to the first summary.")
-                final_summary = first_summary # Fallback to the first summary
-        elif not first_summary:
-            logging.warning("First summary was empty, skipping Mistral summarization.")
-            final_summary = ""
-        else: # mistral_api_key is None
-             logging.warning("Mistral API key not set. Falling back to the first summary.")
-             final_summary = first_summary
- 
-    logging.debug("Processing finished.") # Changed to DEBUG
-    # Add a small delay to allow background tasks (like closing connections) to finish
-    await asyncio.sleep(0.1)
-    return final_summary # Return the final (potentially double) summary
+Based on the query "$query", provide the refined and comprehensive summary:""")
+
+@functools.lru_cache(maxsize=256)
+def _build_prompts(query):
+    """Returns the (system prompt, user prompt suffix) pair for a query."""
+    return _SYSTEM_PROMPT_TEMPLATE.substitute(query=query), _USER_PROMPT_SUFFIX_TEMPLATE.substitute(query=query)
+
+def _build_mistral_request(query, first_summary, mistral_model_name, mistral_max_tokens, stream=False):
+    """Builds the headers and JSON payload for the Mistral refinement call."""
+    # Construct the prompt from the cached, query-specific parts
+    system_prompt, user_prompt_suffix = _build_prompts(query)
+    user_prompt = "".join((_USER_PROMPT_PREFIX, first_summary, user_prompt_suffix))
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+    headers = {
+        "Authorization": f"Bearer {mistral_api_key}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream" if stream else "application/json"
+    }
+    payload = {
+        "model": mistral_model_name,
+        "messages": messages,
+        "max_tokens": mistral_max_tokens
+    }
+    if stream:
+        payload["stream"] = True
+    return headers, payload
+
+def count_tokens(text):
+    """Counts tokens with tiktoken when installed, otherwise estimates ~4 characters per token."""
+    encoding = _get_token_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 4
+
+def _should_use_mistral(first_summary, skip_refine_below_tokens=0):
+    """Logs and returns whether the Mistral refinement step should run for this first summary."""
+    if not first_summary:
+        logging.warning("First summary was empty, skipping Mistral summarization.")
+        return False
+    if not mistral_api_key:
+        logging.warning("Mistral API key not set. Falling back to the first summary.")
+        return False
+    # Optionally return very short first summaries as-is; they gain little from a Mistral round-trip
+    if skip_refine_below_tokens > 0:
+        token_count = count_tokens(first_summary)
+        if token_count < skip_refine_below_tokens:
+            logging.debug(f"First summary is already short (~{token_count} tokens), skipping Mistral summarization.")
+            return False
+    return True
+
+async def _refine_with_mistral(query, first_summary, mistral_model_name, mistral_max_tokens, skip_refine_below_tokens=0):
+    """Second summarization using the Mistral API; falls back to the first summary on any failure."""
+    if not _should_use_mistral(first_summary, skip_refine_below_tokens):
+        return first_summary
+
+    logging.debug(f"Performing second summarization using Mistral API (model: {mistral_model_name})...") # Changed to DEBUG
+    try:
+        headers, payload = _build_mistral_request(query, first_summary, mistral_model_name, mistral_max_tokens)
+
+        # Make the API call using the shared aiohttp session
+        session = await get_mistral_session()
+        # The semaphore bounds in-flight Mistral calls across all queries to avoid 429s
+        async with _get_mistral_semaphore(), session.post(mistral_api_url, headers=headers, data=orjson.dumps(payload)) as response:
+            response.raise_for_status() # Raise exception for bad status codes
+            json_response = orjson.loads(await response.read())
+
+            if json_response.get('choices'):
+                final_summary = json_response['choices'][0]['message']['content'].strip()
+                logging.debug(f"Generated Mistral summary ({len(final_summary)} chars) using model {mistral_model_name} with max_tokens: {mistral_max_tokens}.") # Changed to DEBUG
+                return final_summary
+            logging.warning("Mistral API returned no choices. Falling back to the first summary.") # Kept WARNING
+            return first_summary
+
+    except aiohttp.ClientResponseError as e:
+        logging.error(f"Mistral API HTTP Error: {e.status} - {e.message}")
+    except Exception as e:
+        logging.error(f"Error during Mistral API call: {type(e).__name__} - {e}")
+    logging.warning("Falling back to the first summary.")
+    return first_summary # Fallback to the first summary
+
+async def _stream_with_mistral(query, first_summary, mistral_model_name, mistral_max_tokens, skip_refine_below_tokens=0):
+    """
+    Streams the Mistral summary as content deltas; yields the first summary if nothing was produced.
+
+    A failure after some deltas were yielded is re-raised, since falling back would
+    repeat content and stopping silently would pass off a cut-off summary as complete.
+    """
+    if not _should_use_mistral(first_summary, skip_refine_below_tokens):
+        if first_summary:
+            yield first_summary
+        return
+
+    logging.debug(f"Streaming second summarization using Mistral API (model: {mistral_model_name})...")
+    produced = False
+    try:
+        headers, payload = _build_mistral_request(query, first_summary, mistral_model_name, mistral_max_tokens, stream=True)
+        session = await get_mistral_session()
+        # The semaphore bounds in-flight Mistral calls across all queries to avoid 429s
+        async with _get_mistral_semaphore(), session.post(mistral_api_url, headers=headers, data=orjson.dumps(payload)) as response:
+            response.raise_for_status()
+            # The response is Server-Sent Events: one "data: {...}" line per chunk, ending with "data: [DONE]"
+            async for raw_line in response.content:
+                line = raw_line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[len(b"data:"):].strip()
+                if data == b"[DONE]":
+                    break
+                choices = orjson.loads(data).get("choices")
+                if not choices:
+                    continue
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    produced = True
+                    yield delta
+    except aiohttp.ClientResponseError as e:
+        logging.error(f"Mistral API HTTP Error: {e.status} - {e.message}")
+        if produced:
+            raise
+    except Exception as e:
+        logging.error(f"Error during Mistral API stream: {type(e).__name__} - {e}")
+        if produced:
+            raise
+
+    if not produced:
+        logging.warning("Mistral stream produced no output. Falling back to the first summary.")
+        yield first_summary
 
 # Removed the __main__ block for library usage
\ No newline at end of file
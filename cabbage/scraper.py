@@ -1,6 +1,10 @@
 import time
 import argparse
 import logging
+import re
+import asyncio
+import threading
+import aiohttp
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
@@ -16,6 +20,53 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Default wait time for elements to appear (in seconds)
 DEFAULT_WAIT_TIMEOUT = 10
 
+# Default total timeout for a plain HTTP page fetch (in seconds)
+DEFAULT_FETCH_TIMEOUT = 10
+
+# Maximum number of bytes read from a page body; larger pages are truncated
+MAX_HTML_BYTES = 2_000_000
+
+# Chunk size used when streaming page bodies (in bytes)
+READ_CHUNK_SIZE = 65536
+
+# Content types treated as HTML (anything else is skipped without reading the body)
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+# Bytes scanned for a <meta charset> declaration when the response header has none (as browsers do)
+META_CHARSET_SCAN_BYTES = 2048
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9._:-]+)""", re.IGNORECASE)
+
+# Returned by scrape_website() instead of None for non-HTML responses, so callers can tell
+# "not a page" (nothing a browser would fix) apart from a failed fetch
+NON_HTML = object()
+
+# User agent shared by the HTTP fetcher and the Selenium driver
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36"
+
+# Shared aiohttp session for page fetches (created lazily inside the running event loop)
+_FETCH_SESSION = None
+_FETCH_SESSION_LOOP = None
+_FETCH_SESSION_LIMIT = None # Connection limit the session's connector was built with
+_RETIRED_FETCH_SESSIONS = set() # Sessions replaced after a limit change, closed once their fetches finish
+
+# Global cap on simultaneous page fetches across all queries (see set_fetch_limit)
+DEFAULT_MAX_CONCURRENT_FETCHES = 32
+_FETCH_LIMIT = DEFAULT_MAX_CONCURRENT_FETCHES
+_FETCH_SEMAPHORE = None
+_FETCH_SEMAPHORE_LOOP = None
+
+# Cached ChromeDriver binary path (ChromeDriverManager().install() is only resolved once)
+_CHROMEDRIVER_PATH = None
+_CHROMEDRIVER_PATH_LOCK = threading.Lock()
+
+# Pool of reusable headless Chrome drivers for the Selenium fallback (see start_driver_pool)
+DEFAULT_DRIVER_POOL_SIZE = 4
+_DRIVER_POOL_SIZE = DEFAULT_DRIVER_POOL_SIZE
+_IDLE_DRIVERS = [] # Launched drivers not currently borrowed
+_ALL_DRIVERS = set() # Every live driver, idle or borrowed, so shutdown can quit them all
+_DRIVER_SLOTS = None # asyncio.Semaphore bounding borrowed drivers to _DRIVER_POOL_SIZE
+_DRIVER_SLOTS_LOOP = None
+
 # --- Functions ---
 def setup_driver_options():
     """Sets up Chrome options for Selenium."""
@@ -24,7 +75,7 @@ def setup_driver_options():
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     # Rotate user agents or use a library for better stealth in real-world scenarios
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36")
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
     # Disable automation flags (might help avoid detection)
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_experimental_option('useAutomationExtension', False)
@@ -33,62 +84,329 @@ def setup_driver_options():
     # chrome_options.add_argument("--window-size=1920,1080")
     return chrome_options
 
-def scrape_website(url, wait_timeout=DEFAULT_WAIT_TIMEOUT):
+async def get_fetch_session():
     """
-    Scrapes the HTML content of a given URL using Selenium with explicit waits.
+    Returns the shared aiohttp session used for page fetches, creating it on first use.
+
+    The session is tied to the event loop it was created in, so a new one is
+    built (releasing the old one) if the previous session was closed or belongs
+    to another loop. Its
+    connection pool is sized to the process-wide fetch limit (see set_fetch_limit),
+    so fetches admitted by the fetch semaphore never queue for a connection; after
+    the limit changes, the session is rebuilt with a matching pool.
+
+    Returns:
+        aiohttp.ClientSession: The shared session.
+    """
+    global _FETCH_SESSION, _FETCH_SESSION_LOOP, _FETCH_SESSION_LIMIT
+    loop = asyncio.get_running_loop()
+    if _FETCH_SESSION_LOOP is not loop:
+        await close_stale_session(_FETCH_SESSION, _FETCH_SESSION_LOOP)
+    if _FETCH_SESSION is not None and not _FETCH_SESSION.closed and _FETCH_SESSION_LOOP is loop and _FETCH_SESSION_LIMIT != _FETCH_LIMIT:
+        # Let fetches already running on the old connector finish before closing it
+        _RETIRED_FETCH_SESSIONS.add(_FETCH_SESSION)
+        loop.create_task(_close_retired_session(_FETCH_SESSION))
+        _FETCH_SESSION = None
+    if _FETCH_SESSION is None or _FETCH_SESSION.closed or _FETCH_SESSION_LOOP is not loop:
+        _FETCH_SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=_FETCH_LIMIT),
+            timeout=aiohttp.ClientTimeout(total=DEFAULT_FETCH_TIMEOUT),
+            headers={"User-Agent": USER_AGENT},
+        )
+        _FETCH_SESSION_LOOP = loop
+        _FETCH_SESSION_LIMIT = _FETCH_LIMIT
+        logging.debug(f"Created shared fetch session (connection limit: {_FETCH_LIMIT}).")
+    return _FETCH_SESSION
+
+async def _close_retired_session(session):
+    """Closes a replaced fetch session once every fetch started on it has finished or timed out."""
+    try:
+        await asyncio.sleep(DEFAULT_FETCH_TIMEOUT)
+    finally: # Also when cancelled because the event loop is shutting down
+        _RETIRED_FETCH_SESSIONS.discard(session)
+        await session.close()
+
+async def close_stale_session(session, session_loop):
+    """
+    Releases a shared session left over from another event loop (e.g. an earlier asyncio.run()).
+
+    The session is closed on its own loop if that loop is still running (in another thread);
+    otherwise it can no longer be closed normally, so its connector is detached and marked
+    closed, which stops aiohttp from reporting it as an unclosed session.
 
     Args:
-        url (str): The URL of the website to scrape.
-        wait_timeout (int): Maximum time to wait for page elements.
+        session (aiohttp.ClientSession): The session to release (None is ignored).
+        session_loop (asyncio.AbstractEventLoop): The event loop the session was created in.
+    """
+    if session is None or session.closed:
+        return
+    if session_loop is not None and session_loop.is_running():
+        asyncio.run_coroutine_threadsafe(session.close(), session_loop)
+        return
+    connector = session.connector
+    session.detach()
+    if connector is not None:
+        await connector.close() # Nothing left to wait for once the old loop has stopped
+
+async def close_fetch_session():
+    """Closes the shared fetch session, if one is open, and any session retired by set_fetch_limit."""
+    global _FETCH_SESSION, _FETCH_SESSION_LOOP, _FETCH_SESSION_LIMIT
+    if _FETCH_SESSION is not None and not _FETCH_SESSION.closed:
+        await _FETCH_SESSION.close()
+        logging.debug("Shared fetch session closed.")
+    for session in list(_RETIRED_FETCH_SESSIONS):
+        await session.close()
+    _RETIRED_FETCH_SESSIONS.clear()
+    _FETCH_SESSION = None
+    _FETCH_SESSION_LOOP = None
+    _FETCH_SESSION_LIMIT = None
+
+def set_fetch_limit(limit):
+    """
+    Sets the maximum number of page fetches in flight at once, across all queries.
+
+    Both the fetch semaphore and the shared session's connection pool follow the
+    new limit from their next use.
+    """
+    global _FETCH_LIMIT, _FETCH_SEMAPHORE
+    _FETCH_LIMIT = limit
+    _FETCH_SEMAPHORE = None # Recreated with the new limit on next use
+
+def _get_fetch_semaphore():
+    """Returns the semaphore bounding concurrent fetches, creating it for the running event loop."""
+    global _FETCH_SEMAPHORE, _FETCH_SEMAPHORE_LOOP
+    loop = asyncio.get_running_loop()
+    if _FETCH_SEMAPHORE is None or _FETCH_SEMAPHORE_LOOP is not loop:
+        _FETCH_SEMAPHORE = asyncio.Semaphore(_FETCH_LIMIT)
+        _FETCH_SEMAPHORE_LOOP = loop
+    return _FETCH_SEMAPHORE
+
+def _decode_html(body, header_charset, url):
+    """
+    Decodes a page body with the charset from the Content-Type header, else from a
+    <meta charset> declaration near the top of the page, else as UTF-8.
+
+    Unknown charset labels (e.g. "utf8mb4") are logged and skipped rather than raising.
+    """
+    meta = _META_CHARSET_RE.search(body, 0, META_CHARSET_SCAN_BYTES)
+    for charset in (header_charset, meta and meta.group(1).decode("ascii")):
+        if not charset:
+            continue
+        try:
+            return body.decode(charset, errors="replace")
+        except LookupError:
+            logging.debug(f"Unknown charset {charset!r} at {url}, trying the next candidate.")
+    return body.decode("utf-8", errors="replace")
+
+def get_chrome_service():
+    """
+    Returns a ChromeDriver service, installing the driver binary on first use only.
+
+    Each driver needs its own Service (it owns the chromedriver process), but the
+    binary path resolved by ChromeDriverManager is cached for the process lifetime.
+    """
+    global _CHROMEDRIVER_PATH
+    with _CHROMEDRIVER_PATH_LOCK:
+        if _CHROMEDRIVER_PATH is None:
+            _CHROMEDRIVER_PATH = ChromeDriverManager().install()
+    return Service(_CHROMEDRIVER_PATH)
+
+async def scrape_website(session, url):
+    """
+    Fetches the raw HTML of a URL with a plain HTTP GET (no JavaScript rendering).
+
+    Most pages don't need a browser, so this is the default scraping path;
+    use scrape_with_selenium() for pages that only render with JavaScript.
+
+    Args:
+        session (aiohttp.ClientSession): The session to issue the request with.
+        url (str): The URL to fetch.
 
     Returns:
-        str: The HTML source of the page, or None if an error occurs.
+        str: The HTML body of the page (at most MAX_HTML_BYTES), NON_HTML if the
+             response is not HTML, or None if the request fails.
     """
-    logging.debug(f"Attempting to scrape: {url}") # Changed to DEBUG
-    html_content = None
-    driver = None
+    logging.debug(f"Fetching over HTTP: {url}")
+    # Bound total outbound fetches so concurrent queries don't swamp target sites
+    async with _get_fetch_semaphore():
+        if session.closed:
+            session = await get_fetch_session() # Retired by a fetch limit change while this fetch was queued
+        try:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                # Skip PDFs, images and other binary assets before reading anything
+                # (aiohttp reports a missing header as application/octet-stream, so check the raw header)
+                if "Content-Type" in response.headers and response.content_type not in HTML_CONTENT_TYPES:
+                    logging.warning(f"Skipping non-HTML content ({response.content_type}) at {url}")
+                    return NON_HTML
+                # Stream the body with a hard size cap so bloated pages don't balloon memory
+                buffer = bytearray()
+                async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+                    buffer += chunk
+                    if len(buffer) > MAX_HTML_BYTES:
+                        logging.debug(f"Truncated {url} at {MAX_HTML_BYTES} bytes.")
+                        del buffer[MAX_HTML_BYTES:]
+                        break
+                return _decode_html(buffer, response.charset, url)
+        except aiohttp.ClientResponseError as e:
+            logging.warning(f"HTTP {e.status} while fetching {url}")
+        except asyncio.TimeoutError:
+            logging.warning(f"Timeout occurred after {DEFAULT_FETCH_TIMEOUT} seconds while fetching {url}")
+        except aiohttp.ClientError as e:
+            logging.warning(f"HTTP error while fetching {url}: {e}")
+    return None
+
+def _launch_driver():
+    """Launches a new headless Chrome driver (blocking)."""
+    driver = webdriver.Chrome(service=get_chrome_service(), options=setup_driver_options())
+    _ALL_DRIVERS.add(driver)
+    logging.debug("Launched headless Chrome driver.")
+    return driver
+
+def _quit_driver(driver):
+    """Quits a driver and forgets it (blocking)."""
+    _ALL_DRIVERS.discard(driver)
+    driver.quit()
+
+def _get_driver_slots():
+    """Returns the semaphore bounding borrowed drivers, creating it for the running event loop."""
+    global _DRIVER_SLOTS, _DRIVER_SLOTS_LOOP
+    loop = asyncio.get_running_loop()
+    if _DRIVER_SLOTS is None or _DRIVER_SLOTS_LOOP is not loop:
+        _DRIVER_SLOTS = asyncio.Semaphore(_DRIVER_POOL_SIZE)
+        _DRIVER_SLOTS_LOOP = loop
+    return _DRIVER_SLOTS
+
+async def start_driver_pool(size=DEFAULT_DRIVER_POOL_SIZE):
+    """
+    Sets the driver pool size and pre-launches drivers up to it.
+
+    Drivers are otherwise launched on demand (up to the pool size), so calling
+    this is optional; it moves the browser cold start off the first request.
 
+    Args:
+        size (int): Maximum number of Chrome drivers in use at once.
+    """
+    global _DRIVER_POOL_SIZE, _DRIVER_SLOTS
+    _DRIVER_POOL_SIZE = size
+    _DRIVER_SLOTS = None # Recreated with the new size on next use
+    missing = max(0, size - len(_IDLE_DRIVERS))
+    loop = asyncio.get_running_loop()
+    drivers = await asyncio.gather(*(loop.run_in_executor(None, _launch_driver) for _ in range(missing)), return_exceptions=True)
+    for driver in drivers:
+        if isinstance(driver, BaseException):
+            logging.error(f"Could not pre-launch Chrome driver: {driver}")
+        else:
+            _IDLE_DRIVERS.append(driver)
+    logging.info(f"Driver pool ready ({len(_IDLE_DRIVERS)} idle drivers).")
+
+async def close_driver_pool():
+    """Quits every launched driver, including ones still borrowed by an in-flight scrape."""
+    drivers = list(_ALL_DRIVERS)
+    _IDLE_DRIVERS.clear()
+    loop = asyncio.get_running_loop()
+    # A borrowed driver's scrape fails with a WebDriverException and its release skips the pool
+    await asyncio.gather(*(loop.run_in_executor(None, _quit_driver, driver) for driver in drivers), return_exceptions=True)
+    if drivers:
+        logging.debug(f"Closed {len(drivers)} pooled browsers.")
+
+async def _acquire_driver():
+    """Borrows an idle driver (launching one if none is idle), waiting while the pool is fully in use."""
+    slots = _get_driver_slots()
+    await slots.acquire()
+    if _IDLE_DRIVERS:
+        return _IDLE_DRIVERS.pop()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, _launch_driver)
+    except BaseException:
+        slots.release()
+        raise
+
+async def _release_driver(driver, healthy):
+    """Returns a borrowed driver to the pool, or quits it if it errored."""
+    loop = asyncio.get_running_loop()
     try:
-        chrome_options = setup_driver_options()
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        if driver not in _ALL_DRIVERS:
+            return # Already quit by close_driver_pool while borrowed
+        if healthy:
+            try:
+                # Don't leak one site's session into the next scrape
+                await loop.run_in_executor(None, driver.delete_all_cookies)
+                _IDLE_DRIVERS.append(driver)
+                return
+            except WebDriverException as e:
+                logging.debug(f"Discarding driver after cleanup failed: {e}")
+        try:
+            await loop.run_in_executor(None, _quit_driver, driver)
+            logging.debug("Browser closed.") # Changed to DEBUG
+        except Exception as e:
+            logging.debug(f"Error while closing browser: {e}")
+    finally:
+        _get_driver_slots().release()
 
-        # Optional: Execute JavaScript to prevent detection (example)
-        # driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+def _load_page_source(driver, url, wait_timeout):
+    """Navigates the driver to the URL and returns the rendered page source (blocking)."""
+    # Optional: Execute JavaScript to prevent detection (example)
+    # driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
 
-        logging.debug(f"Navigating to {url}") # Changed to DEBUG
-        driver.get(url)
+    logging.debug(f"Navigating to {url}") # Changed to DEBUG
+    driver.get(url)
 
-        logging.debug(f"Waiting up to {wait_timeout} seconds for page body to load...") # Changed to DEBUG
-        # Wait for the body element to be present, indicating basic page load
-        WebDriverWait(driver, wait_timeout).until(
-            EC.presence_of_element_located((By.TAG_NAME, "body"))
-        )
-        logging.debug("Page body loaded.") # Changed to DEBUG
+    logging.debug(f"Waiting up to {wait_timeout} seconds for page body to load...") # Changed to DEBUG
+    # Wait for the body element to be present, indicating basic page load
+    WebDriverWait(driver, wait_timeout).until(
+        EC.presence_of_element_located((By.TAG_NAME, "body"))
+    )
+    logging.debug("Page body loaded.") # Changed to DEBUG
 
-        # Optional: Add more specific waits here if needed for dynamic content
-        # Example: Wait for a specific container div
-        # WebDriverWait(driver, wait_timeout).until(
-        #     EC.presence_of_element_located((By.ID, "content-container"))
-        # )
+    # Optional: Add more specific waits here if needed for dynamic content
+    # Example: Wait for a specific container div
+    # WebDriverWait(driver, wait_timeout).until(
+    #     EC.presence_of_element_located((By.ID, "content-container"))
+    # )
 
-        # Give a brief moment for any final JS rendering (can be adjusted/removed)
-        time.sleep(1)
+    # Give a brief moment for any final JS rendering (can be adjusted/removed)
+    time.sleep(1)
 
-        html_content = driver.page_source
-        logging.debug("Successfully retrieved page source.") # Changed to DEBUG
+    return driver.page_source
 
+async def scrape_with_selenium(url, wait_timeout=DEFAULT_WAIT_TIMEOUT):
+    """
+    Scrapes the HTML content of a given URL using Selenium with explicit waits.
+
+    This renders the page in headless Chrome and is much slower than
+    scrape_website(), so it is only meant as a fallback for JavaScript-rendered
+    pages. Drivers are borrowed from a bounded pool and reused across calls.
+
+    Args:
+        url (str): The URL of the website to scrape.
+        wait_timeout (int): Maximum time to wait for page elements.
+
+    Returns:
+        str: The HTML source of the page, or None if an error occurs.
+    """
+    logging.debug(f"Attempting to scrape: {url}") # Changed to DEBUG
+    html_content = None
+    try:
+        driver = await _acquire_driver()
+    except Exception as e:
+        logging.error(f"Could not start Chrome driver: {e}")
+        return None
+
+    healthy = True
+    try:
+        html_content = await asyncio.get_running_loop().run_in_executor(None, _load_page_source, driver, url, wait_timeout)
+        logging.debug("Successfully retrieved page source.") # Changed to DEBUG
     except TimeoutException:
         logging.error(f"Timeout occurred after {wait_timeout} seconds while waiting for elements on {url}")
     except WebDriverException as e:
+        healthy = False
         logging.error(f"WebDriver error occurred: {e}")
     except Exception as e:
+        healthy = False
         logging.error(f"An unexpected error occurred during scraping: {e}")
-
     finally:
-        if driver:
-            driver.quit()
-            logging.debug("Browser closed.") # Changed to DEBUG
+        await _release_driver(driver, healthy)
 
     return html_content
 
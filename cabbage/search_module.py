@@ -1,13 +1,24 @@
+import asyncio
 import logging
 from duckduckgo_search import DDGS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def search_urls(query, num_results=5):
+def _search_urls_blocking(query, num_results):
+    """Runs the (blocking) DuckDuckGo text search and returns only the result URLs."""
+    # Use DDGS context manager for text search
+    with DDGS() as ddgs:
+        # Only the 'href' of each result is kept
+        return [result['href'] for result in ddgs.text(query, max_results=num_results)][:num_results]
+
+async def search_urls(query, num_results=5):
     """
     Performs a web search using DuckDuckGo and returns the top URLs.
 
+    The DuckDuckGo client is synchronous, so the search runs in the default
+    executor to keep the event loop free for other requests.
+
     Args:
         query (str): The search query.
         num_results (int): The maximum number of search result URLs to return.
@@ -18,14 +29,10 @@ def search_urls(query, num_results=5):
     logging.debug(f"Performing search for query: '{query}' (max {num_results} results)") # Changed to DEBUG
     urls = []
     try:
-        # Use DDGS context manager for text search
-        with DDGS() as ddgs:
-            # Fetch results using ddgs.text() which returns a generator
-            # Convert generator to list to get all results up to max_results
-            results = list(ddgs.text(query, max_results=num_results))
-
-        if results:
-            urls = [result['href'] for result in results]
+        loop = asyncio.get_running_loop()
+        urls = await loop.run_in_executor(None, _search_urls_blocking, query, num_results)
+
+        if urls:
             logging.debug(f"Found {len(urls)} URLs: {urls}") # Changed to DEBUG
         else:
             logging.warning(f"No search results found for query: '{query}'")
@@ -35,4 +42,4 @@ def search_urls(query, num_results=5):
 
     return urls
 
-# Removed the __main__ block for library usage
\ No newline at end of file
+# Removed the __main__ block for library usage
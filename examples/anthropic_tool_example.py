@@ -1,24 +1,36 @@
 # anthropic_tool_example.py
-import json
+import orjson
 import os
-import argparse
+import sys
 import requests # Use requests for synchronous HTTP calls to Cabbage API
 from anthropic import Anthropic # Use the official Anthropic library
 from dotenv import load_dotenv
 
 # Import the function to call your local Cabbage API server
-from client_example import call_search_api
+from client_example import call_search_api, parse_query_args
 
 # --- Load Environment Variables ---
-load_dotenv()
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-if not ANTHROPIC_API_KEY:
-    print("ERROR: ANTHROPIC_API_KEY environment variable not set.")
-    print("Please set it in your environment or in a .env file.")
-    exit(1) # Exit if the key is missing
+def _load_api_key():
+    """Returns ANTHROPIC_API_KEY, reading .env only when it is not already set (e.g. injected by a container)."""
+    if "ANTHROPIC_API_KEY" not in os.environ:
+        load_dotenv()
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    if not api_key:
+        raise RuntimeError("ANTHROPIC_API_KEY environment variable not set.")
+    return api_key
+
+# Model used unless -m/--model is given on the command line
+DEFAULT_MODEL = "claude-3-opus-20240229" # Using Opus as default
 
 # --- Anthropic API Client ---
-client = Anthropic(api_key=ANTHROPIC_API_KEY)
+_client = None # Created on first use, then shared by every interaction in the process
+
+def _get_client():
+    """Returns the shared Anthropic client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = Anthropic(api_key=_load_api_key())
+    return _client
 
 # --- Tool Definition for Anthropic ---
 # Anthropic uses a specific format for tool definition
@@ -65,7 +77,7 @@ def execute_cabbage_search(query: str):
         return result
 
 # --- Main Interaction Logic ---
-def run_anthropic_interaction(user_request: str, model="claude-3-opus-20240229"): # Using Opus as default
+def run_anthropic_interaction(user_request: str, model=DEFAULT_MODEL):
     """
     Handles the interaction with the Anthropic API using the official library.
     """
@@ -85,7 +97,7 @@ def run_anthropic_interaction(user_request: str, model="claude-3-opus-20240229")
 
     try:
         # --- First API Call ---
-        response1 = client.messages.create(
+        response1 = _get_client().messages.create(
             model=model,
             system=system_prompt,
             messages=messages,
@@ -123,7 +135,7 @@ def run_anthropic_interaction(user_request: str, model="claude-3-opus-20240229")
                     {
                         "type": "tool_result",
                         "tool_use_id": tool_call_id,
-                        "content": json.dumps(tool_result_dict), # Content should be a JSON string or list of blocks
+                        "content": orjson.dumps(tool_result_dict).decode(), # Content should be a JSON string or list of blocks
                         # Can also use "is_error": True if needed
                     }
                 ]
@@ -131,7 +143,7 @@ def run_anthropic_interaction(user_request: str, model="claude-3-opus-20240229")
 
             print("\n--- Sending Tool Result Back to Anthropic ---")
             # --- Second API Call ---
-            response2 = client.messages.create(
+            response2 = _get_client().messages.create(
                 model=model,
                 system=system_prompt,
                 messages=messages,
@@ -158,13 +170,23 @@ def run_anthropic_interaction(user_request: str, model="claude-3-opus-20240229")
         print(f"Error during Anthropic API interaction: {type(e).__name__} - {e}")
 
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Interact with Anthropic API using the Cabbage Search tool via the Cabbage API server.")
-    parser.add_argument("query", help="The query/question to ask Anthropic.")
-    parser.add_argument("-m", "--model", default="claude-3-opus-20240229", help="Anthropic model to use (must support tool use).")
-    args = parser.parse_args()
+def main():
+    """Command-line entry point."""
+    # Interact with Anthropic API using the Cabbage Search tool via the Cabbage API server.
+    # Usage: python anthropic_tool_example.py QUERY [-m MODEL]   (the model must support tool use)
+    query, model = parse_query_args("anthropic_tool_example.py", DEFAULT_MODEL)
+    try:
+        _get_client() # Fail fast on a missing key, before starting the interaction
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        print("Please set it in your environment or in a .env file.")
+        sys.exit(1) # Exit if the key is missing
 
     print("--- Starting Anthropic Interaction ---")
     print("NOTE: Make sure the Cabbage API server (cabbage/api_server.py) is running on http://127.0.0.1:8000")
-    run_anthropic_interaction(args.query, model=args.model)
-    print("\n--- Interaction Complete ---")
\ No newline at end of file
+    run_anthropic_interaction(query, model=model)
+    print("\n--- Interaction Complete ---")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,15 +1,141 @@
 # client_example.py
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import asyncio
+import aiohttp
 import json
-import argparse
+import orjson
+import sys
+import os
+import threading
+import time
+from collections import OrderedDict
 
-# Define the API endpoint URL
+# Define the API endpoint URLs
 API_URL = "http://127.0.0.1:8000/search"
+BATCH_API_URL = API_URL + "/batch"
+
+# (connect, read) timeouts in seconds; the read timeout covers the whole search + summarization.
+# Override the read timeout with CABBAGE_TIMEOUT.
+API_TIMEOUT = (3.05, float(os.getenv("CABBAGE_TIMEOUT", "30")))
+BATCH_API_TIMEOUT = (3.05, 2 * API_TIMEOUT[1]) # Queries of a batch run concurrently, but the slowest one bounds the response
+
+# Maximum pooled connections per host (override with CABBAGE_POOL_MAX); callers beyond it wait for a free one
+POOL_MAXSIZE = int(os.getenv("CABBAGE_POOL_MAX", "32"))
+
+# Shared session so repeated calls (e.g. LLM tool-call loops) reuse keep-alive connections.
+# Transient backend failures are retried with backoff instead of reaching the caller as "no summary".
+_ADAPTER = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=POOL_MAXSIZE,
+    pool_block=True,
+    max_retries=Retry(
+        total=3,
+        connect=3,
+        read=0, # A read timeout means the server is still working; re-POSTing would run the pipeline again
+        backoff_factor=0.25,
+        status_forcelist=(503, 504), # Not 502: the server uses it for upstream failures that won't clear on retry
+        allowed_methods=frozenset(["POST"]) # POST is not retried by default; searches are safe to repeat
+    )
+)
+_SESSION = requests.Session()
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+# Failures reaching the API (after the adapter's retries); anything else is a bug and propagates
+_TRANSPORT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.RetryError)
+
+# --- Response Cache ---
+# LLM tool loops often repeat the same search; cache successful responses in-process.
+# Entries younger than _TTL are served directly. Entries younger than _STALE_TTL are
+# still served, but trigger a background refresh (stale-while-revalidate).
+_TTL = 120.0
+_STALE_TTL = 600.0
+_CACHE_MAXSIZE = 256
+_CACHE = OrderedDict() # normalized query -> (monotonic timestamp, response dict)
+_CACHE_LOCK = threading.Lock()
+_REFRESHING = set() # Keys with a background refresh in flight
+
+def _cache_key(query: str) -> str:
+    """Normalizes a query so case and whitespace differences share one cache entry."""
+    return " ".join(query.lower().split())
+
+def _cache_get(query: str):
+    """Returns the cached response for query (or None), refreshing it in the background if stale."""
+    key = _cache_key(query)
+    with _CACHE_LOCK:
+        entry = _CACHE.get(key)
+        if entry is None:
+            return None
+        timestamp, result = entry
+        age = time.monotonic() - timestamp
+        if age >= _STALE_TTL:
+            del _CACHE[key]
+            return None
+        _CACHE.move_to_end(key) # Mark as most recently used
+        if age < _TTL or key in _REFRESHING:
+            return result
+        _REFRESHING.add(key)
+    threading.Thread(target=_refresh, args=(query, key), daemon=True).start()
+    return result
+
+def _cache_put(query: str, result: dict):
+    """Stores a response that has a summary, evicting the least recently used entries over the cap."""
+    key = _cache_key(query)
+    with _CACHE_LOCK:
+        _CACHE[key] = (time.monotonic(), result)
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > _CACHE_MAXSIZE:
+            _CACHE.popitem(last=False)
+
+def _refresh(query: str, key: str):
+    """Background refresh of a stale cache entry."""
+    try:
+        _fetch_search(query)
+    finally:
+        with _CACHE_LOCK:
+            _REFRESHING.discard(key)
+
+def parse_query_args(script: str, default_model: str = None):
+    """
+    Parses the command line of the example scripts: QUERY, plus [-m MODEL] if default_model is given.
+
+    Prints usage and exits with status 0 for -h/--help, or with status 1 on bad usage.
+
+    Args:
+        script (str): The script name shown in the usage line.
+        default_model (str): The model used without -m/--model; None if the script takes no model.
+
+    Returns:
+        tuple: (query, model), where model is default_model unless overridden.
+    """
+    usage = f"usage: python {script} QUERY"
+    if default_model is not None:
+        usage += f" [-m MODEL]  (default model: {default_model})"
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(usage)
+        sys.exit(0)
+    model = default_model
+    if default_model is not None:
+        for flag in ("-m", "--model"):
+            if flag in args:
+                index = args.index(flag)
+                if index + 1 == len(args):
+                    sys.exit(usage) # Flag without a value
+                model = args[index + 1]
+                del args[index:index + 2]
+    if len(args) != 1:
+        sys.exit(usage)
+    return args[0], model
 
 def call_search_api(query: str):
     """
     Calls the Cabbage Search Engine API to get a summary for the given query.
 
+    Repeated queries are answered from an in-process cache (see _TTL / _STALE_TTL).
+
     Args:
         query (str): The search query.
 
@@ -17,29 +143,163 @@ def call_search_api(query: str):
         dict: The JSON response from the API containing the query and summary,
               or None if the API call fails.
     """
+    cached = _cache_get(query)
+    if cached is not None:
+        print(f"Cache hit for query: '{query}'")
+        return cached
+    return _fetch_search(query)
+
+def _fetch_search(query: str):
+    """Performs the HTTP call for call_search_api() and caches a response that has a summary."""
     print(f"Sending query to Cabbage Search API: '{query}'")
     try:
         # The API expects the query as a query parameter in a POST request
         # Although POST usually has a body, FastAPI allows query params for POST
         # Alternatively, you could change the API to accept a JSON body
-        response = requests.post(API_URL, params={"query": query})
-        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-        result = response.json()
-        print("Received response from API.")
-        return result
-    except requests.exceptions.RequestException as e:
+        response = _SESSION.post(API_URL, params={"query": query}, timeout=API_TIMEOUT)
+    except _TRANSPORT_ERRORS as e:
         print(f"Error calling Cabbage Search API: {e}")
         return None
-    except json.JSONDecodeError:
+    if response.status_code >= 400:
+        print(f"Error calling Cabbage Search API: HTTP {response.status_code} - {response.text}")
+        return None
+    try:
+        result = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        # e.g. an HTML error page from a proxy in front of the API
         print(f"Error decoding JSON response from API. Response text: {response.text}")
         return None
+    print("Received response from API.")
+    if result.get("summary"):
+        _cache_put(query, result)
+    return result
+
+async def async_call_search_api(session: aiohttp.ClientSession, query: str):
+    """
+    Async variant of call_search_api, for clients that run several searches concurrently.
+    Shares call_search_api's response cache.
+
+    Args:
+        session (aiohttp.ClientSession): The session to issue the request with.
+        query (str): The search query.
+
+    Returns:
+        dict: The JSON response from the API containing the query and summary,
+              or None if the API call fails.
+    """
+    cached = _cache_get(query)
+    if cached is not None:
+        print(f"Cache hit for query: '{query}'")
+        return cached
+    print(f"Sending query to Cabbage Search API: '{query}'")
+    try:
+        async with session.post(API_URL, params={"query": query}, timeout=aiohttp.ClientTimeout(sock_connect=API_TIMEOUT[0], sock_read=API_TIMEOUT[1])) as response:
+            response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+            result = await response.json()
+            print("Received response from API.")
+            if result.get("summary"):
+                _cache_put(query, result)
+            return result
+    except aiohttp.ClientError as e:
+        print(f"Error calling Cabbage Search API: {e}")
+        return None
+    except asyncio.TimeoutError:
+        print("Error calling Cabbage Search API: request timed out")
+        return None
+    except json.JSONDecodeError:
+        print("Error decoding JSON response from API.")
+        return None
+
+def _split_cached(queries: list):
+    """Returns per-query results filled from the cache, and the distinct queries still to fetch."""
+    results = [_cache_get(query) for query in queries]
+    misses = list(dict.fromkeys(query for query, result in zip(queries, results) if result is None))
+    return results, misses
+
+def _merge_batch(queries: list, results: list, fetched: dict):
+    """Fills the cache misses in results from fetched (query -> result), caching those with a summary."""
+    for query, result in fetched.items():
+        if result is not None and result.get("summary"):
+            _cache_put(query, result)
+    return [result if result is not None else fetched.get(query) for query, result in zip(queries, results)]
+
+def call_search_api_batch(queries: list):
+    """
+    Gets summaries for several queries with one request to the /search/batch endpoint.
+
+    Cached queries are not sent again. Against a server without the batch
+    endpoint, falls back to one call_search_api() call per query.
+
+    Args:
+        queries (list): The search queries.
+
+    Returns:
+        list: One response dict per query, in order (a dict with an "error" field
+              if that query failed on the server), or None entries if the API call fails.
+    """
+    results, misses = _split_cached(queries)
+    if not misses:
+        return results
+    print(f"Sending {len(misses)} queries to Cabbage Search batch API")
+    try:
+        response = _SESSION.post(BATCH_API_URL, data=orjson.dumps({"queries": misses}),
+                                 headers={"Content-Type": "application/json"}, timeout=BATCH_API_TIMEOUT)
+    except _TRANSPORT_ERRORS as e:
+        print(f"Error calling Cabbage Search batch API: {e}")
+        return _merge_batch(queries, results, {})
+    if response.status_code == 404:
+        print("Batch endpoint not available, sending queries one by one.")
+        return _merge_batch(queries, results, {query: _fetch_search(query) for query in misses})
+    if response.status_code >= 400:
+        print(f"Error calling Cabbage Search batch API: HTTP {response.status_code} - {response.text}")
+        return _merge_batch(queries, results, {})
+    try:
+        fetched = dict(zip(misses, orjson.loads(response.content)["results"]))
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        print(f"Error decoding JSON response from batch API. Response text: {response.text}")
+        return _merge_batch(queries, results, {})
+    print("Received batch response from API.")
+    return _merge_batch(queries, results, fetched)
+
+async def async_call_search_api_batch(session: aiohttp.ClientSession, queries: list):
+    """
+    Async variant of call_search_api_batch. Against a server without the batch
+    endpoint, falls back to concurrent async_call_search_api() calls.
+
+    Args:
+        session (aiohttp.ClientSession): The session to issue the request with.
+        queries (list): The search queries.
+
+    Returns:
+        list: One response dict (or None) per query, in order.
+    """
+    results, misses = _split_cached(queries)
+    if not misses:
+        return results
+    print(f"Sending {len(misses)} queries to Cabbage Search batch API")
+    fetched = {}
+    try:
+        async with session.post(BATCH_API_URL, json={"queries": misses}, timeout=aiohttp.ClientTimeout(sock_connect=BATCH_API_TIMEOUT[0], sock_read=BATCH_API_TIMEOUT[1])) as response:
+            if response.status == 404:
+                print("Batch endpoint not available, sending queries concurrently.")
+                singles = await asyncio.gather(*(async_call_search_api(session, query) for query in misses))
+                return _merge_batch(queries, results, dict(zip(misses, singles)))
+            response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+            fetched = dict(zip(misses, (await response.json())["results"]))
+            print("Received batch response from API.")
+    except aiohttp.ClientError as e:
+        print(f"Error calling Cabbage Search batch API: {e}")
+    except asyncio.TimeoutError:
+        print("Error calling Cabbage Search batch API: request timed out")
+    except (json.JSONDecodeError, KeyError, TypeError):
+        print("Error decoding JSON response from batch API.")
+    return _merge_batch(queries, results, fetched)
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Example client for the Cabbage Search Engine API.")
-    parser.add_argument("query", help="The search query to send to the API.")
-    args = parser.parse_args()
+    # Example client for the Cabbage Search Engine API: sends one search query
+    query, _ = parse_query_args("client_example.py")
 
-    search_result = call_search_api(args.query)
+    search_result = call_search_api(query)
 
     if search_result:
         print("\n--- API Response ---")
@@ -1,14 +1,40 @@
 # library_usage_example.py
 import asyncio
 import logging
+import os
+import pathlib
+import sys
 
 # Import directly from the cabbage package
 # Assumes the 'cabbage' folder is in the same directory or accessible via PYTHONPATH
-from cabbage import process_query, load_config, DEFAULT_CONFIG
+import cabbage
+from cabbage import process_query, load_config, close_sessions, DEFAULT_CONFIG
 
 # Configure basic logging for the example
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Query used when none are given on the command line
+DEFAULT_QUERY = "What are the latest advancements in quantum computing?"
+
+# The file load_config() reads by default
+CONFIG_PATH = pathlib.Path(cabbage.__file__).with_name("config.json")
+
+# Parsed config, reused until the file's modification time changes
+_CFG_CACHE = {"mtime": None, "data": None}
+
+def _cached_load_config():
+    """Returns load_config()'s result, re-reading config.json only when it has changed on disk."""
+    try:
+        mtime = os.stat(CONFIG_PATH).st_mtime_ns
+    except OSError:
+        mtime = None # Missing file: load_config() falls back to defaults
+    if _CFG_CACHE["data"] is not None and mtime == _CFG_CACHE["mtime"]:
+        return _CFG_CACHE["data"]
+    config = load_config()
+    _CFG_CACHE["mtime"] = mtime
+    _CFG_CACHE["data"] = config
+    return config
+
 async def run_cabbage_search(search_term: str):
     """
     Demonstrates calling the Cabbage library directly.
@@ -19,7 +45,7 @@ async def run_cabbage_search(search_term: str):
     # This step is optional; process_query will use defaults if config is not loaded
     # or if specific parameters are omitted in the call.
     try:
-        config = load_config()
+        config = _cached_load_config()
         logging.info(f"Loaded config: {config}")
         # Extract config values or use defaults
         num_results = config.get("search_results_count", DEFAULT_CONFIG["search_results_count"])
@@ -50,7 +76,7 @@ async def run_cabbage_search(search_term: str):
         )
 
         if summary:
-            print("\n" + "="*20 + " SUMMARY " + "="*20)
+            print("\n" + "="*20 + f" SUMMARY: {search_term} " + "="*20)
             print(summary)
             print("="*50)
         else:
@@ -61,10 +87,27 @@ async def run_cabbage_search(search_term: str):
 
     logging.info("--- Cabbage Library Example Complete ---")
 
+async def main(queries: list):
+    """
+    Runs all queries concurrently on one event loop, so they share Cabbage's
+    HTTP sessions and connection pools.
+    """
+    try:
+        await asyncio.gather(*(run_cabbage_search(query) for query in queries))
+    finally:
+        await close_sessions() # Close the shared sessions while their event loop is still running
+
 
 if __name__ == "__main__":
-    # Example query
-    query = "What are the latest advancements in quantum computing?"
+    # Queries from the command line, e.g. python library_usage_example.py "first query" "second query"
+    queries = sys.argv[1:] or [DEFAULT_QUERY]
+
+    # Use uvloop's faster event loop when it is installed (not available on Windows)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
 
-    # Run the async function
-    asyncio.run(run_cabbage_search(query))
\ No newline at end of file
+    # Run all queries under a single event loop
+    asyncio.run(main(queries))
\ No newline at end of file
@@ -1,28 +1,58 @@
 # mistral_tool_example.py
-import json
+import orjson # Fast JSON encode/decode for payloads and tool arguments
 import os
-import argparse
-import requests # Use requests for synchronous HTTP calls
+import re
+import sys
+import asyncio
+import aiohttp # Async HTTP calls to the Cabbage API, so several tool calls can run concurrently
+import httpx # Async HTTP/2 client for the Mistral API
+import fastjsonschema # Compiled validation of tool-call arguments
 from dotenv import load_dotenv
 
 # Import the function to call your local API server
-from client_example import call_search_api
+from client_example import async_call_search_api, parse_query_args
 
 # --- Load Environment Variables ---
-load_dotenv()
-MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
-if not MISTRAL_API_KEY:
-    print("ERROR: MISTRAL_API_KEY environment variable not set.")
-    print("Please set it in your environment or in a .env file.")
-    exit(1) # Exit if the key is missing
+def _load_api_key():
+    """Returns MISTRAL_API_KEY, reading .env only when it is not already set (e.g. injected by a container)."""
+    if "MISTRAL_API_KEY" not in os.environ:
+        load_dotenv()
+    api_key = os.getenv("MISTRAL_API_KEY")
+    if not api_key:
+        raise RuntimeError("MISTRAL_API_KEY environment variable not set.")
+    return api_key
+
+# Set CABBAGE_DEBUG=1 to print the full request/response payloads of each call
+DEBUG = os.getenv("CABBAGE_DEBUG") == "1"
+
+# Set CABBAGE_SPECULATE=1 to start a search for the user request while the first Mistral call
+# is in flight. It saves a round trip when Mistral searches for (nearly) the request itself, but
+# costs a full server pipeline (search, scrape, summarize) whenever Mistral picks another query.
+SPECULATE = os.getenv("CABBAGE_SPECULATE") == "1"
+
+# Minimum token-set Jaccard similarity for a tool call's query to reuse the speculative search
+SPECULATION_MIN_SIMILARITY = 0.6
+
+# Model used unless -m/--model is given on the command line
+DEFAULT_MODEL = "mistral-large-latest"
 
 # --- Mistral API Configuration ---
 MISTRAL_API_URL = "https://api.mistral.ai/v1/chat/completions"
-HEADERS = {
-    "Authorization": f"Bearer {MISTRAL_API_KEY}",
-    "Content-Type": "application/json",
-    "Accept": "application/json"
-}
+_headers = None # Built on first use by _get_headers(), which needs the API key
+
+def _get_headers():
+    """Returns the request headers for the Mistral API, building them on first use."""
+    global _headers
+    if _headers is None:
+        _headers = {
+            "Authorization": f"Bearer {_load_api_key()}",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+    return _headers
+
+MISTRAL_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+MISTRAL_LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=8)
 
 # --- Tool Definition for Mistral ---
 cabbage_search_tool_definition = {
@@ -45,13 +75,33 @@ cabbage_search_tool_definition = {
 
 # Available tools list for the API payload
 tools = [cabbage_search_tool_definition]
+TOOL_NAMES = tuple(tool["function"]["name"] for tool in tools)
+
+# Compiled argument validators, built once from each tool's own parameter schema
+ARGUMENT_VALIDATORS = {tool["function"]["name"]: fastjsonschema.compile(tool["function"]["parameters"]) for tool in tools}
+
+# --- Static Request Parts ---
+# These are identical for every request, so the tool schema is encoded to JSON only once
+SYSTEM_PROMPT = """You are a helpful assistant. When you use tools to gather information, synthesize the results into a clear, comprehensive, and informative answer for the user. Do not just state that you used a tool; explain what you found in a user-friendly way."""
+TOOLS_JSON_BYTES = orjson.dumps(tools)
+
+def build_request_body(model: str, messages: list, with_tools: bool) -> bytes:
+    """Builds the streaming JSON request body, splicing in the pre-encoded tool definitions."""
+    body = b'{"model":' + orjson.dumps(model) + b',"stream":true,"messages":' + orjson.dumps(messages)
+    if with_tools:
+        body += b',"tools":' + TOOLS_JSON_BYTES + b',"tool_choice":"auto"'
+    return body + b'}'
 
 # --- Function to Execute Local Tool ---
-def execute_cabbage_search(query: str):
-    """Calls the local Cabbage Search API."""
+async def execute_cabbage_search(session: aiohttp.ClientSession, query: str, pending_search=None):
+    """Calls the local Cabbage Search API, or awaits pending_search if one is already running for this query."""
     print(f"\n--- Executing Tool: cabbage_web_search ---")
     print(f"Query: {query}")
-    api_response = call_search_api(query) # Function from client_example.py
+    if pending_search is not None:
+        print("Reusing the speculative search started with the first Mistral call.")
+        api_response = await pending_search
+    else:
+        api_response = await async_call_search_api(session, query) # Function from client_example.py
 
     if api_response and api_response.get("summary"):
         result = api_response["summary"]
@@ -70,139 +120,240 @@ def execute_cabbage_search(query: str):
 def format_mistral_response(content):
     """Formats the potentially structured response from Mistral into a readable string."""
     if isinstance(content, list):
-        formatted_text = ""
+        parts = [] # Collected pieces, joined once at the end
         for item in content:
             if isinstance(item, dict) and item.get("type") == "text":
-                formatted_text += item.get("text", "")
+                parts.append(item.get("text", ""))
             # Optionally handle 'reference' types if needed, e.g., append [ref_id]
             elif isinstance(item, dict) and item.get("type") == "reference":
                  # Simple example: append reference IDs if they exist
                  ref_ids = item.get("reference_ids")
                  if ref_ids:
-                     formatted_text += f" [References: {', '.join(map(str, ref_ids))}]"
-        return formatted_text.strip() # Remove leading/trailing whitespace
+                     parts.append(f" [References: {', '.join(map(str, ref_ids))}]")
+        return "".join(parts).strip() # Remove leading/trailing whitespace
     elif isinstance(content, str):
         return content # Return as is if it's already a string
     else:
         # Fallback for unexpected formats
         return str(content)
 
+# --- Function to Call Mistral ---
+async def stream_mistral(client: httpx.AsyncClient, body: bytes, header: str, on_tool_calls=None):
+    """
+    Streams a chat completion from Mistral, printing content as it arrives.
+
+    Args:
+        client (httpx.AsyncClient): The client to issue the request with.
+        body (bytes): The encoded request body (with "stream": true).
+        header (str): Printed once, before the first content chunk.
+        on_tool_calls (callable, optional): Called with the assembled tool calls as soon as
+            Mistral finishes requesting them, before the stream is closed.
+
+    Returns:
+        dict: The assembled assistant message, ready to append to the conversation history.
+    """
+    content_parts = []
+    tool_calls = {} # Tool call index -> call, assembled from the deltas
+    # The client headers already set the JSON Content-Type; the response is Server-Sent Events
+    async with client.stream("POST", MISTRAL_API_URL, content=body, headers={"Accept": "text/event-stream"}) as response:
+        if response.status_code >= 400:
+            await response.aread()
+            print(f"Response Status Code: {response.status_code}")
+            print(f"Response Body: {response.text}")
+        response.raise_for_status() # Raise HTTPStatusError for bad responses (4xx or 5xx)
+        # One "data: {...}" line per chunk, ending with "data: [DONE]"
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            choices = orjson.loads(data).get("choices")
+            if not choices:
+                continue
+            delta = choices[0].get("delta") or {}
+            content = delta.get("content")
+            if content:
+                text = content if isinstance(content, str) else format_mistral_response(content)
+                if not content_parts:
+                    print(header)
+                print(text, end="", flush=True)
+                content_parts.append(text)
+            for position, tool_call_delta in enumerate(delta.get("tool_calls") or ()):
+                call = tool_calls.setdefault(tool_call_delta.get("index", position), {
+                    "id": "", "type": "function", "function": {"name": "", "arguments": ""}
+                })
+                if tool_call_delta.get("id"):
+                    call["id"] = tool_call_delta["id"]
+                function_delta = tool_call_delta.get("function") or {}
+                call["function"]["name"] += function_delta.get("name") or ""
+                call["function"]["arguments"] += function_delta.get("arguments") or ""
+            if choices[0].get("finish_reason") == "tool_calls" and on_tool_calls:
+                on_tool_calls(list(tool_calls.values()))
+    if content_parts:
+        print() # End the streamed line
+
+    assistant_message = {"role": "assistant", "content": "".join(content_parts)}
+    if tool_calls:
+        assistant_message["tool_calls"] = list(tool_calls.values())
+    return assistant_message
+
+def query_tokens(query: str) -> frozenset:
+    """Returns the set of lowercased words in query, to compare a tool call's query with the user request."""
+    return frozenset(re.findall(r"\w+", query.lower()))
+
+def query_similarity(tokens_a: frozenset, tokens_b: frozenset) -> float:
+    """Jaccard similarity of two token sets (1.0 for identical queries, 0.0 for disjoint ones)."""
+    if not tokens_a or not tokens_b:
+        return 0.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+async def run_tool_call(session: aiohttp.ClientSession, tool_call: dict, speculation: dict = None):
+    """
+    Executes one tool call requested by Mistral and returns the tool message for it.
+
+    If the call's query is at least SPECULATION_MIN_SIMILARITY similar to speculation["tokens"],
+    the already running speculation["task"] is reused instead of starting a new search.
+    """
+    function_name = tool_call['function']['name']
+    print(f"Tool to Call: {function_name}")
+
+    # Execute the correct local function
+    if function_name == "cabbage_web_search":
+        try:
+            function_args = orjson.loads(tool_call['function']['arguments'])
+            ARGUMENT_VALIDATORS[function_name](function_args) # Reject malformed arguments before calling the API
+        except (orjson.JSONDecodeError, fastjsonschema.JsonSchemaException) as e:
+            print(f"Error: Invalid arguments for {function_name}: {e}")
+            tool_result = f"Error: Invalid arguments for '{function_name}': {e}"
+        else:
+            print(f"Arguments: {function_args}")
+            pending_search = None
+            if speculation and query_similarity(query_tokens(function_args["query"]), speculation["tokens"]) >= SPECULATION_MIN_SIMILARITY:
+                speculation["used"] = True
+                pending_search = speculation["task"]
+            tool_result = await execute_cabbage_search(session, query=function_args["query"], pending_search=pending_search)
+    else:
+        print(f"Error: Unknown tool requested: {function_name}")
+        tool_result = f"Error: Unknown tool '{function_name}'."
+
+    return {
+        "role": "tool",
+        "name": function_name,
+        "content": tool_result,
+        "tool_call_id": tool_call['id']
+    }
+
 # --- Main Interaction Logic ---
-def run_mistral_interaction_via_http(user_request: str, model="mistral-large-latest"):
+async def run_mistral_interaction_via_http(user_request: str, model=DEFAULT_MODEL):
     """
     Handles the interaction with the Mistral API via direct HTTP requests.
     """
-    # Define the system prompt
-    system_prompt = """You are a helpful assistant. When you use tools to gather information, synthesize the results into a clear, comprehensive, and informative answer for the user. Do not just state that you used a tool; explain what you found in a user-friendly way."""
-
     # Start the conversation history with the system prompt and the user request
     messages = [
-        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": user_request}
     ]
 
     print(f"\n--- Sending Request to Mistral ---")
-    print(f"System Prompt: {system_prompt}")
+    print(f"System Prompt: {SYSTEM_PROMPT}")
     print(f"User Request: {user_request}")
     print(f"Model: {model}")
-    print(f"Tools Available: {[tool['function']['name'] for tool in tools]}")
-
-    try:
-        # --- First API Call ---
-        payload1 = {
-            "model": model,
-            "messages": messages,
-            "tools": tools,
-            "tool_choice": "auto"
-        }
-        print(f"Payload (1st call): {json.dumps(payload1, indent=2)}")
-        response1 = requests.post(MISTRAL_API_URL, headers=HEADERS, json=payload1)
-        response1.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-        response1_data = response1.json()
-        print(f"Response (1st call): {json.dumps(response1_data, indent=2)}")
-
-        assistant_message = response1_data['choices'][0]['message']
-        messages.append(assistant_message) # Add assistant's response to history
-
-        # Check if Mistral decided to use a tool
-        if assistant_message.get("tool_calls"):
-            print("\n--- Mistral Responded with Tool Call ---")
-            tool_call = assistant_message["tool_calls"][0] # Assuming one tool call
-            function_name = tool_call['function']['name']
-            function_args_str = tool_call['function']['arguments']
-            function_args = json.loads(function_args_str)
-            tool_call_id = tool_call['id']
-
-            print(f"Tool to Call: {function_name}")
-            print(f"Arguments: {function_args}")
+    if DEBUG:
+        print(f"Tools Available: {TOOL_NAMES}")
 
-            # Execute the correct local function
-            if function_name == "cabbage_web_search":
-                tool_result = execute_cabbage_search(query=function_args.get("query"))
-            else:
-                print(f"Error: Unknown tool requested: {function_name}")
-                tool_result = f"Error: Unknown tool '{function_name}'."
-
-            # Append the tool's result message
-            tool_message = {
-                "role": "tool",
-                "name": function_name,
-                "content": tool_result,
-                "tool_call_id": tool_call_id
-            }
-            messages.append(tool_message)
-
-            print("\n--- Sending Tool Result Back to Mistral ---")
-            # --- Second API Call ---
-            payload2 = {
-                "model": model,
-                "messages": messages
-                # No tools needed here
+    # Both Mistral calls of the conversation share one HTTP/2 connection
+    async with httpx.AsyncClient(http2=True, headers=_get_headers(), timeout=MISTRAL_TIMEOUT, limits=MISTRAL_LIMITS) as mistral_client, \
+               aiohttp.ClientSession() as cabbage_session:
+        # Many requests are answered with a search for (nearly) the request itself, so with
+        # SPECULATE that search starts now, overlapping it with the first Mistral call. It is
+        # reused if Mistral asks for a similar query, and cancelled otherwise.
+        speculation = None
+        if SPECULATE:
+            print("Speculatively searching for the user request while Mistral responds.")
+            speculation = {
+                "tokens": query_tokens(user_request),
+                "task": asyncio.create_task(async_call_search_api(cabbage_session, user_request)),
+                "used": False
             }
-            print(f"Payload (2nd call): {json.dumps(payload2, indent=2)}")
-            response2 = requests.post(MISTRAL_API_URL, headers=HEADERS, json=payload2)
-            response2.raise_for_status()
-            response2_data = response2.json()
-            print(f"Raw Response (2nd call): {json.dumps(response2_data, indent=2)}") # Keep raw log
+        try:
+            # --- First API Call ---
+            body1 = build_request_body(model, messages, with_tools=True)
+            if DEBUG:
+                print(f"Payload (1st call): {orjson.dumps(orjson.loads(body1), option=orjson.OPT_INDENT_2).decode()}")
+            tool_tasks = []
 
-            raw_final_content = response2_data['choices'][0]['message']['content']
-            final_output = format_mistral_response(raw_final_content) # Format the response
+            def start_tool_calls(tool_calls):
+                """Starts every requested tool call concurrently, in request order."""
+                if tool_tasks:
+                    return
+                print("\n--- Mistral Responded with Tool Call(s) ---")
+                tool_tasks.extend(asyncio.create_task(run_tool_call(cabbage_session, tool_call, speculation)) for tool_call in tool_calls)
 
-            print("\n--- Final Formatted Response from Mistral (after tool use) ---")
-            print(final_output) # Print the formatted response
+            # Tool calls start as soon as Mistral has finished requesting them, while the stream closes
+            assistant_message = await stream_mistral(
+                mistral_client, body1, "\n--- Streaming Response from Mistral ---", on_tool_calls=start_tool_calls
+            )
+            if DEBUG:
+                print(f"Response (1st call): {orjson.dumps(assistant_message, option=orjson.OPT_INDENT_2).decode()}")
+            messages.append(assistant_message) # Add assistant's response to history
 
-        else:
-            # Mistral answered directly without using a tool
-            raw_final_content = assistant_message['content']
-            final_output = format_mistral_response(raw_final_content) # Format the response
-
-            print("\n--- Mistral Responded Directly (Formatted) ---")
-            print(final_output) # Print the formatted response
-
-    except requests.exceptions.RequestException as e:
-        print(f"\n--- HTTP Request Error ---")
-        print(f"Error during Mistral API call: {e}")
-        if e.response is not None:
-            print(f"Response Status Code: {e.response.status_code}")
-            try:
-                print(f"Response Body: {e.response.text}")
-            except Exception:
-                print("Could not read response body.")
-    except json.JSONDecodeError as e:
-        print(f"\n--- JSON Parsing Error ---")
-        print(f"Could not decode JSON response from Mistral API: {e}")
-    except Exception as e:
-        print(f"\n--- An Unexpected Error Occurred ---")
-        print(f"Error during Mistral API interaction: {type(e).__name__} - {e}")
+            # Check if Mistral decided to use a tool
+            if assistant_message.get("tool_calls"):
+                start_tool_calls(assistant_message["tool_calls"]) # No-op if already started from the stream
+                tool_messages = await asyncio.gather(*tool_tasks)
+                messages.extend(tool_messages) # Append the tools' result messages
+                if speculation and not speculation["used"]:
+                    speculation["task"].cancel() # Free the connection before the second call
 
+                print("\n--- Sending Tool Result(s) Back to Mistral ---")
+                # --- Second API Call ---
+                body2 = build_request_body(model, messages, with_tools=False) # No tools needed here
+                if DEBUG:
+                    print(f"Payload (2nd call): {orjson.dumps(orjson.loads(body2), option=orjson.OPT_INDENT_2).decode()}")
+                # The formatted response is printed as it streams in
+                final_message = await stream_mistral(
+                    mistral_client, body2, "\n--- Final Formatted Response from Mistral (after tool use) ---"
+                )
+                if DEBUG:
+                    print(f"Raw Response (2nd call): {orjson.dumps(final_message, option=orjson.OPT_INDENT_2).decode()}") # Keep raw log
+
+            # Otherwise Mistral answered directly without using a tool, and the answer was already streamed
+
+        except httpx.HTTPStatusError as e:
+            print(f"\n--- HTTP Request Error ---")
+            print(f"Error during Mistral API call: {e.response.status_code} {e.response.reason_phrase}")
+        except httpx.HTTPError as e:
+            print(f"\n--- HTTP Request Error ---")
+            print(f"Error during Mistral API call: {type(e).__name__} - {e}")
+        except orjson.JSONDecodeError as e:
+            print(f"\n--- JSON Parsing Error ---")
+            print(f"Could not decode JSON response from Mistral API: {e}")
+        except Exception as e:
+            print(f"\n--- An Unexpected Error Occurred ---")
+            print(f"Error during Mistral API interaction: {type(e).__name__} - {e}")
+        finally:
+            if speculation and not speculation["used"]:
+                speculation["task"].cancel() # Mistral answered directly, asked for other queries, or failed
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Interact with Mistral API via HTTP using the Cabbage Search tool.")
-    parser.add_argument("query", help="The query/question to ask Mistral.")
-    parser.add_argument("-m", "--model", default="mistral-large-latest", help="Mistral model to use (must support tool calling).")
-    args = parser.parse_args()
+
+def main():
+    """Command-line entry point."""
+    # Interact with Mistral API via HTTP using the Cabbage Search tool.
+    # Usage: python mistral_tool_example.py QUERY [-m MODEL]   (the model must support tool calling)
+    query, model = parse_query_args("mistral_tool_example.py", DEFAULT_MODEL)
+    try:
+        _get_headers() # Fail fast on a missing key, before starting the interaction
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        print("Please set it in your environment or in a .env file.")
+        sys.exit(1) # Exit if the key is missing
 
     print("--- Starting Mistral Interaction via HTTP ---")
     print("NOTE: Make sure the Cabbage API server (api_server.py) is running on http://127.0.0.1:8000")
-    run_mistral_interaction_via_http(args.query, model=args.model)
-    print("\n--- Interaction Complete ---")
\ No newline at end of file
+    asyncio.run(run_mistral_interaction_via_http(query, model=model))
+    print("\n--- Interaction Complete ---")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,24 +1,49 @@
 # openai_tool_example.py
-import json
+import orjson # Fast JSON encode/decode for payloads and tool arguments
 import os
-import argparse
-import requests # Use requests for synchronous HTTP calls to Cabbage API
-from openai import OpenAI # Use the official OpenAI library
+import sys
+import asyncio
+import aiohttp # Async HTTP calls to the Cabbage API, so tool calls can run concurrently
+import httpx # HTTP/2 transport for the OpenAI client
+import fastjsonschema # Compiled validation of tool-call arguments
+from openai import AsyncOpenAI # Use the official OpenAI library (async client)
 from dotenv import load_dotenv
 
 # Import the function to call your local Cabbage API server
-from client_example import call_search_api
+from client_example import async_call_search_api_batch, parse_query_args
 
 # --- Load Environment Variables ---
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    print("ERROR: OPENAI_API_KEY environment variable not set.")
-    print("Please set it in your environment or in a .env file.")
-    exit(1) # Exit if the key is missing
+def _load_api_key():
+    """Returns OPENAI_API_KEY, reading .env only when it is not already set (e.g. injected by a container)."""
+    if "OPENAI_API_KEY" not in os.environ:
+        load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY environment variable not set.")
+    return api_key
+
+# Set CABBAGE_DEBUG=1 to print extra details about each interaction
+DEBUG = os.getenv("CABBAGE_DEBUG") == "1"
+
+# Model used unless -m/--model is given on the command line
+DEFAULT_MODEL = "gpt-4o"
 
 # --- OpenAI API Client ---
-client = OpenAI(api_key=OPENAI_API_KEY)
+def _create_client():
+    """
+    Creates an OpenAI client for one interaction; close it with `await client.close()`.
+
+    Its pooled connections belong to the event loop they were opened on, so a client
+    must not outlive the loop (e.g. across separate asyncio.run() calls).
+    """
+    # Use an HTTP/2 connection pool so the calls of a conversation share one multiplexed connection
+    return AsyncOpenAI(
+        api_key=_load_api_key(),
+        http_client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=8)
+        )
+    )
 
 # --- Tool Definition for OpenAI ---
 # Note: OpenAI uses a slightly different format than Mistral
@@ -42,120 +67,219 @@ cabbage_search_tool_definition = {
 
 # Available tools list for the API payload
 tools = [cabbage_search_tool_definition]
+TOOL_NAMES = tuple(tool["function"]["name"] for tool in tools)
 
-# --- Function to Execute Local Tool ---
-def execute_cabbage_search(query: str):
-    """Calls the local Cabbage Search API."""
-    print(f"\n--- Executing Tool: cabbage_web_search ---")
-    print(f"Query: {query}")
-    # Assuming client_example.call_search_api handles the request and returns a dict
-    api_response = call_search_api(query)
+# Compiled argument validators, built once from each tool's own parameter schema
+ARGUMENT_VALIDATORS = {tool["function"]["name"]: fastjsonschema.compile(tool["function"]["parameters"]) for tool in tools}
+
+# --- Static Conversation Parts ---
+SYSTEM_PROMPT = """You are a helpful assistant. When you use tools to gather information, synthesize the results into a clear, comprehensive, and informative answer for the user. Do not just state that you used a tool; explain what you found in a user-friendly way."""
+# Leading messages shared by every conversation; copied into each new history
+_BASE_MESSAGES = ({"role": "system", "content": SYSTEM_PROMPT},)
 
+# --- Function to Execute Local Tool ---
+def format_search_result(api_response):
+    """Turns one Cabbage API response into the tool result string OpenAI expects."""
     if api_response and api_response.get("summary"):
         result = api_response["summary"]
         print(f"Tool Success: Summary received (Length: {len(result)}).")
         # OpenAI expects tool results as strings
-        return json.dumps({"summary": result})
+        return orjson.dumps({"summary": result}).decode()
     elif api_response and api_response.get("message"):
         result = f"Search completed, but no summary could be generated. API Message: {api_response['message']}"
         print(f"Tool Warning: {result}")
-        return json.dumps({"message": result})
+        return orjson.dumps({"message": result}).decode()
     else:
         error_message = "Error: Failed to get a valid response or summary from the Cabbage Search API."
         print(f"Tool Error: {error_message}")
-        return json.dumps({"error": error_message})
+        return orjson.dumps({"error": error_message}).decode()
+
+async def execute_cabbage_search(session: aiohttp.ClientSession, queries: list):
+    """Calls the local Cabbage Search API once for all queries; returns one result string per query."""
+    print(f"\n--- Executing Tool: cabbage_web_search ---")
+    print(f"Queries: {queries}")
+    # Assuming client_example.async_call_search_api_batch returns one dict (or None) per query
+    api_responses = await async_call_search_api_batch(session, queries)
+    return [format_search_result(api_response) for api_response in api_responses]
+
+# Tool name -> local function; each takes the session and the list of queries of all its calls
+AVAILABLE_FUNCTIONS = {
+    "cabbage_web_search": execute_cabbage_search,
+}
+
+# --- Tool Dispatch ---
+async def run_tool_calls(tool_calls: list):
+    """Runs the requested tool calls and returns a dict of tool_call id -> result string."""
+    # Group the requested calls by tool, so each tool runs once for all of its calls
+    tool_results = {}
+    calls_by_function = {}
+    for tool_call in tool_calls:
+        function_name = tool_call["function"]["name"]
+        if function_name not in AVAILABLE_FUNCTIONS:
+            print(f"Error: Unknown tool requested: {function_name}")
+            tool_results[tool_call["id"]] = orjson.dumps({"error": f"Unknown tool '{function_name}'."}).decode()
+            continue
+        print(f"Tool to Call: {function_name}")
+        try:
+            function_args = orjson.loads(tool_call["function"]["arguments"])
+            ARGUMENT_VALIDATORS[function_name](function_args) # Reject malformed arguments before calling the API
+        except (orjson.JSONDecodeError, fastjsonschema.JsonSchemaException) as e:
+            print(f"Error: Invalid arguments for {function_name}: {e}")
+            tool_results[tool_call["id"]] = orjson.dumps({"error": f"Invalid arguments for '{function_name}': {e}"}).decode()
+            continue
+        print(f"Arguments: {function_args}")
+        calls_by_function.setdefault(function_name, []).append((tool_call["id"], function_args["query"]))
+
+    # One batched request per tool, run concurrently; results map back to calls by index
+    async with aiohttp.ClientSession() as session:
+        batches = list(calls_by_function.items())
+        batch_results = await asyncio.gather(*(
+            AVAILABLE_FUNCTIONS[function_name](session, [query for _, query in calls])
+            for function_name, calls in batches
+        ))
+    for (_, calls), results in zip(batches, batch_results):
+        for (tool_call_id, _), result in zip(calls, results):
+            tool_results[tool_call_id] = result
+    return tool_results
+
+# --- Streaming ---
+async def consume_stream(stream, header: str, on_tool_calls=None):
+    """
+    Consumes a streamed chat completion, printing content as it arrives.
+
+    Args:
+        stream: The AsyncStream returned by client.chat.completions.create(..., stream=True).
+        header (str): Printed once, before the first content chunk.
+        on_tool_calls (callable, optional): Called with the assembled tool calls as soon as
+            OpenAI finishes requesting them, before the stream is closed.
+
+    Returns:
+        dict: The assembled assistant message, ready to append to the conversation history.
+    """
+    content_parts = []
+    tool_calls = {} # Tool call index -> call; ids and names arrive first, arguments in fragments
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        delta = choice.delta
+        if delta.content:
+            if not content_parts:
+                print(header)
+            print(delta.content, end="", flush=True)
+            content_parts.append(delta.content)
+        for tool_call_delta in delta.tool_calls or ():
+            call = tool_calls.setdefault(tool_call_delta.index, {
+                "id": "", "type": "function", "function": {"name": "", "arguments": ""}
+            })
+            if tool_call_delta.id:
+                call["id"] = tool_call_delta.id
+            if tool_call_delta.function:
+                call["function"]["name"] += tool_call_delta.function.name or ""
+                call["function"]["arguments"] += tool_call_delta.function.arguments or ""
+        if choice.finish_reason == "tool_calls" and on_tool_calls:
+            on_tool_calls(list(tool_calls.values()))
+    if content_parts:
+        print() # End the streamed line
+
+    assistant_message = {"role": "assistant", "content": "".join(content_parts) or None}
+    if tool_calls:
+        assistant_message["tool_calls"] = list(tool_calls.values())
+    return assistant_message
 
 # --- Main Interaction Logic ---
-def run_openai_interaction(user_request: str, model="gpt-4o"): # Using gpt-4o as default
+async def run_openai_interaction(user_request: str, model=DEFAULT_MODEL):
     """
     Handles the interaction with the OpenAI API using the official library.
     """
-    # Define the system prompt
-    system_prompt = """You are a helpful assistant. When you use tools to gather information, synthesize the results into a clear, comprehensive, and informative answer for the user. Do not just state that you used a tool; explain what you found in a user-friendly way."""
-
     # Start the conversation history
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_request}
-    ]
+    messages = [*_BASE_MESSAGES, {"role": "user", "content": user_request}]
 
     print(f"\n--- Sending Request to OpenAI ---")
-    print(f"System Prompt: {system_prompt}")
+    print(f"System Prompt: {SYSTEM_PROMPT}")
     print(f"User Request: {user_request}")
     print(f"Model: {model}")
-    print(f"Tools Available: {[tool['function']['name'] for tool in tools]}")
+    if DEBUG:
+        print(f"Tools Available: {TOOL_NAMES}")
+
+    client = _create_client()
+    tool_task = None
+
+    def start_tool_calls(tool_calls):
+        """Starts running the requested tool calls in the background."""
+        nonlocal tool_task
+        if tool_task is None:
+            print("\n--- OpenAI Responded with Tool Call(s) ---")
+            tool_task = asyncio.create_task(run_tool_calls(tool_calls))
 
     try:
         # --- First API Call ---
-        response1 = client.chat.completions.create(
+        response1 = await client.chat.completions.create(
             model=model,
             messages=messages,
             tools=tools,
-            tool_choice="auto" # Let OpenAI decide when to use the tool
+            tool_choice="auto", # Let OpenAI decide when to use the tool
+            stream=True
+        )
+        # Tool calls start as soon as OpenAI has finished requesting them, while the stream closes
+        response1_message = await consume_stream(
+            response1, "\n--- Streaming Response from OpenAI ---", on_tool_calls=start_tool_calls
         )
-
-        response1_message = response1.choices[0].message
         messages.append(response1_message) # Add assistant's response to history
 
         # Check if OpenAI decided to use a tool
-        tool_calls = response1_message.tool_calls
+        tool_calls = response1_message.get("tool_calls")
         if tool_calls:
-            print("\n--- OpenAI Responded with Tool Call(s) ---")
-            available_functions = {
-                "cabbage_web_search": execute_cabbage_search,
-            }
+            start_tool_calls(tool_calls) # No-op if already started from the stream
+            tool_results = await tool_task
 
             for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_to_call = available_functions.get(function_name)
-                if not function_to_call:
-                    print(f"Error: Unknown tool requested: {function_name}")
-                    tool_result = json.dumps({"error": f"Unknown tool '{function_name}'."})
-                else:
-                    function_args = json.loads(tool_call.function.arguments)
-                    print(f"Tool to Call: {function_name}")
-                    print(f"Arguments: {function_args}")
-                    tool_result = function_to_call(query=function_args.get("query"))
-
-                # Append the tool's result message
+                # Append the tool's result message, in the order the calls were requested
                 messages.append(
                     {
-                        "tool_call_id": tool_call.id,
+                        "tool_call_id": tool_call["id"],
                         "role": "tool",
-                        "name": function_name,
-                        "content": tool_result, # Content must be a string
+                        "name": tool_call["function"]["name"],
+                        "content": tool_results[tool_call["id"]], # Content must be a string
                     }
                 )
 
             print("\n--- Sending Tool Result(s) Back to OpenAI ---")
             # --- Second API Call ---
-            response2 = client.chat.completions.create(
+            response2 = await client.chat.completions.create(
                 model=model,
-                messages=messages
+                messages=messages,
                 # No tools needed here, just getting the final response
+                stream=True
             )
-            final_content = response2.choices[0].message.content
-            print("\n--- Final Response from OpenAI (after tool use) ---")
-            print(final_content)
+            # The final response is printed as it streams in
+            await consume_stream(response2, "\n--- Final Response from OpenAI (after tool use) ---")
 
-        else:
-            # OpenAI answered directly without using a tool
-            final_content = response1_message.content
-            print("\n--- OpenAI Responded Directly ---")
-            print(final_content)
+        # Otherwise OpenAI answered directly without using a tool, and the answer was already streamed
 
     except Exception as e:
         print(f"\n--- An Unexpected Error Occurred ---")
         print(f"Error during OpenAI API interaction: {type(e).__name__} - {e}")
+    finally:
+        await client.close() # Release the HTTP/2 connections while this event loop is running
 
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Interact with OpenAI API using the Cabbage Search tool via the Cabbage API server.")
-    parser.add_argument("query", help="The query/question to ask OpenAI.")
-    parser.add_argument("-m", "--model", default="gpt-4o", help="OpenAI model to use (must support tool calling).")
-    args = parser.parse_args()
+def main():
+    """Command-line entry point."""
+    # Interact with OpenAI API using the Cabbage Search tool via the Cabbage API server.
+    # Usage: python openai_tool_example.py QUERY [-m MODEL]   (the model must support tool calling)
+    query, model = parse_query_args("openai_tool_example.py", DEFAULT_MODEL)
+    try:
+        _load_api_key() # Fail fast on a missing key, before starting the interaction
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        print("Please set it in your environment or in a .env file.")
+        sys.exit(1) # Exit if the key is missing
 
     print("--- Starting OpenAI Interaction ---")
     print("NOTE: Make sure the Cabbage API server (cabbage/api_server.py) is running on http://127.0.0.1:8000")
-    run_openai_interaction(args.query, model=args.model)
-    print("\n--- Interaction Complete ---")
\ No newline at end of file
+    asyncio.run(run_openai_interaction(query, model=model))
+    print("\n--- Interaction Complete ---")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file